@@ -0,0 +1,259 @@
+# 📦 Локальная подмена YouTube и сервера превью для офлайн-замеров.
+# FakeSite — HTTP-сервер на 127.0.0.1: отдаёт «видео», «звук», субтитры и JPEG-превью,
+# поддерживает Range и HEAD. FakeExtractor — вместо сетевого экстрактора yt-dlp возвращает
+# info_dict с заданным набором форматов, субтитров и дубляжей; дальше работает настоящий
+# yt-dlp (выбор формата, загрузка через http) — мерим свой код, а не заглушки
+import os
+import re
+import shutil
+import hashlib
+import threading
+import subprocess
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_VIDEO_BYTES = 4 * 1024 * 1024
+DEFAULT_AUDIO_BYTES = 512 * 1024
+THUMB_SIZES = ((1280, 720), (480, 360), (320, 180), (120, 90))
+
+_MEDIA_RE = re.compile(r"^/media/([\w-]+)/([\w-]+)\.(\w+)$")
+_THUMB_RE = re.compile(r"^/thumb/([\w-]+)/(\d+)x(\d+)\.jpg$")
+_SUB_RE = re.compile(r"^/subs/([\w-]+)/([\w-]+)\.vtt$")
+
+
+def synthetic_block(seed):
+    # Детерминированное содержимое: блок 64 КБ повторяется, весь файл в памяти не держим
+    return hashlib.sha256(seed.encode("utf-8")).digest() * 2048
+
+
+def make_real_media(workdir, seconds=5):
+    # Настоящие mp4/m4a для замера сведения — только если есть ffmpeg
+    if not shutil.which("ffmpeg"):
+        return {}
+    os.makedirs(workdir, exist_ok=True)
+    video = os.path.join(workdir, "video.mp4")
+    audio = os.path.join(workdir, "audio.m4a")
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate=30:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-an", video], check=True)
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-c:a", "aac", "-vn", audio], check=True)
+    return {"video": video, "audio": audio}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        site = self.server.site
+        path = self.path.split("?")[0]
+        m = _MEDIA_RE.match(path)
+        if m:
+            return self._media(site, m.group(1), m.group(2), m.group(3), body)
+        m = _THUMB_RE.match(path)
+        if m:
+            return self._bytes(site.thumb(int(m.group(2)), int(m.group(3))), "image/jpeg", body, etag=f'"{m.group(2)}x{m.group(3)}"')
+        m = _SUB_RE.match(path)
+        if m:
+            text = f"WEBVTT\n\n00:00:00.000 --> 00:00:02.000\n{m.group(1)} {m.group(2)}\n"
+            return self._bytes(text.encode("utf-8"), "text/vtt", body)
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _bytes(self, data, ctype, body, etag=None):
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _media(self, site, video_id, format_id, ext, body):
+        real = site.real_file(format_id)
+        size = os.path.getsize(real) if real else site.size_of(format_id)
+        start, end = 0, size - 1
+        rng = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if rng and rng.group(1):
+            start = int(rng.group(1))
+            if rng.group(2):
+                end = min(int(rng.group(2)), size - 1)
+        if start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if rng and rng.group(1) else 200)
+        self.send_header("Content-Type", "video/mp4" if ext == "mp4" else "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if rng and rng.group(1):
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        try:
+            if real:
+                with open(real, "rb") as f:
+                    f.seek(start)
+                    self.wfile.write(f.read(end - start + 1))
+            else:
+                self._write_range(f"{video_id}/{format_id}", start, end)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_range(self, seed, start, end):
+        block = synthetic_block(seed)
+        pos = start
+        while pos <= end:
+            offset = pos % len(block)
+            chunk = block[offset:offset + (end - pos + 1)]
+            self.wfile.write(chunk)
+            pos += len(chunk)
+
+
+class FakeSite:
+    def __init__(self, video_bytes=DEFAULT_VIDEO_BYTES, audio_bytes=DEFAULT_AUDIO_BYTES, real_media=None):
+        # real_media: {"video": путь, "audio": путь} — отдавать настоящие файлы вместо синтетики
+        self.video_bytes = video_bytes
+        self.audio_bytes = audio_bytes
+        self.real_media = real_media or {}
+        self._thumbs = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.site = self
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def is_audio(self, format_id):
+        return format_id.startswith(("140", "251"))
+
+    def size_of(self, format_id):
+        return self.audio_bytes if self.is_audio(format_id) else self.video_bytes
+
+    def real_file(self, format_id):
+        return self.real_media.get("audio" if self.is_audio(format_id) else "video")
+
+    def thumb(self, width, height):
+        with self._lock:
+            data = self._thumbs.get((width, height))
+        if data is None:
+            from PIL import Image
+            buf = BytesIO()
+            Image.new("RGB", (width, height), (255, 153, 204)).save(buf, "JPEG", quality=85)
+            data = buf.getvalue()
+            with self._lock:
+                self._thumbs[(width, height)] = data
+        return data
+
+
+class FakeExtractor:
+    def __init__(self, site, extra_video_formats=0, subtitles=("en", "ru"), dubs=("ru", "es")):
+        self.site = site
+        self.extra_video_formats = extra_video_formats
+        self.subtitles = subtitles
+        self.dubs = dubs
+        self._patched = None
+
+    @staticmethod
+    def video_id(index):
+        return f"fake{index:07d}"  # 11 символов, как у YouTube
+
+    def url(self, index):
+        return f"{self.site.base_url}/watch?v={self.video_id(index)}"
+
+    def handles(self, url):
+        return url.startswith(self.site.base_url)
+
+    def _fmt(self, video_id, format_id, ext, **fields):
+        size = self.site.size_of(format_id)
+        real = self.site.real_file(format_id)
+        if real:
+            size = os.path.getsize(real)
+        return dict(fields, format_id=format_id, ext=ext, protocol="http", filesize=size,
+                    url=f"{self.site.base_url}/media/{video_id}/{format_id}.{ext}")
+
+    def info(self, url):
+        m = re.search(r"v=([\w-]{11})", url)
+        video_id = m.group(1) if m else "fake0000000"
+        base = self.site.base_url
+        formats = [
+            self._fmt(video_id, "18", "mp4", vcodec="avc1.42001E", acodec="mp4a.40.2", height=360, width=640, fps=30, tbr=500),
+            self._fmt(video_id, "136", "mp4", vcodec="avc1.4d401f", acodec="none", height=720, width=1280, fps=30, tbr=1500),
+            self._fmt(video_id, "137", "mp4", vcodec="avc1.640028", acodec="none", height=1080, width=1920, fps=30, tbr=3000),
+            self._fmt(video_id, "140", "m4a", vcodec="none", acodec="mp4a.40.2", abr=128, tbr=128),
+            self._fmt(video_id, "251", "webm", vcodec="none", acodec="opus", abr=160, tbr=160),
+        ]
+        for i in range(self.extra_video_formats):
+            height = 144 + i * 10
+            formats.append(self._fmt(video_id, f"v{i}", "mp4", vcodec="avc1.4d4015", acodec="none",
+                                     height=height, width=height * 16 // 9, fps=30, tbr=100 + i))
+        for lang in self.dubs:
+            formats.append(self._fmt(video_id, f"140-{lang}", "m4a", vcodec="none", acodec="mp4a.40.2", abr=128,
+                                     tbr=128, language=lang, format_note=f"{lang} (dubbed)"))
+        thumbnails = [
+            {"id": str(i), "url": f"{base}/thumb/{video_id}/{w}x{h}.jpg", "width": w, "height": h, "preference": -i}
+            for i, (w, h) in enumerate(THUMB_SIZES)
+        ]
+        return {
+            "id": video_id,
+            "title": f"Fake video {video_id}",
+            "webpage_url": url,
+            "extractor": "fake",
+            "extractor_key": "Fake",
+            "duration": 5,
+            "thumbnails": thumbnails,
+            "thumbnail": thumbnails[0]["url"],
+            "formats": formats,
+            "subtitles": {
+                lang: [{"ext": "vtt", "url": f"{base}/subs/{video_id}/{lang}.vtt"}] for lang in self.subtitles
+            },
+        }
+
+    def install(self):
+        # Подменяем только извлечение для ссылок FakeSite; обработка и загрузка — настоящие
+        import yt_dlp
+        original = yt_dlp.YoutubeDL.extract_info
+        fake = self
+
+        def extract_info(ydl, url, download=True, *args, **kwargs):
+            if not fake.handles(url):
+                return original(ydl, url, download, *args, **kwargs)
+            return ydl.process_ie_result(fake.info(url), download=download)
+
+        yt_dlp.YoutubeDL.extract_info = extract_info
+        self._patched = original
+        return self
+
+    def uninstall(self):
+        if self._patched:
+            import yt_dlp
+            yt_dlp.YoutubeDL.extract_info = self._patched
+            self._patched = None
@@ -0,0 +1,103 @@
+# 📦 Замер холодного запуска: сколько длится импорт интерфейса и показ окна,
+# и не попали ли тяжёлые модули (yt_dlp, Pillow, requests, pywebview) в путь запуска.
+#   python benchmarks/startup.py [--runs 5] [--out startup.json] [--max-import-ms 150]
+# Каждый замер — в отдельном процессе, чтобы кэш импортов не искажал результат.
+# Код возврата 1, если превышен порог или тяжёлый модуль загружен до показа окна
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("yt_dlp", "PIL", "requests", "webview", "tkinterweb")
+
+# Импорт модулей окна (без Tk-окна: работает и без дисплея)
+IMPORT_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import ui_sakura
+ms = (time.perf_counter() - t) * 1000
+print(json.dumps({"ms": ms, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+# От старта процесса до первой отрисовки главного окна
+WINDOW_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+from tkinter import Tk
+from ui_sakura import SakuraDownloader
+root = Tk()
+app = SakuraDownloader(root)
+root.update()
+ms = (time.perf_counter() - t) * 1000
+heavy = [m for m in %r if m in sys.modules]
+root.destroy()
+print(json.dumps({"ms": ms, "heavy": heavy}))
+""" % (HEAVY_MODULES,)
+
+
+def run_probe(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1:] or ["unknown error"]
+    return json.loads(result.stdout.strip().splitlines()[-1]), None
+
+
+def measure(code, runs):
+    times, heavy, error = [], set(), None
+    for _ in range(runs):
+        data, error = run_probe(code)
+        if data is None:
+            break
+        times.append(data["ms"])
+        heavy.update(data["heavy"])
+    if not times:
+        return {"skipped": True, "error": error[0] if error else None}
+    return {
+        "runs": len(times),
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "heavy_modules": sorted(heavy),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени запуска Sakura Downloader")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию — только stdout)")
+    parser.add_argument("--max-import-ms", type=float, help="порог медианы импорта интерфейса")
+    parser.add_argument("--max-window-ms", type=float, help="порог медианы показа окна")
+    args = parser.parse_args(argv)
+
+    result = {"python": sys.version.split()[0], "import": measure(IMPORT_PROBE, args.runs)}
+    # Окно меряем только при наличии дисплея (на headless-сервере Tk не создаётся)
+    if os.name == "nt" or os.environ.get("DISPLAY"):
+        result["window"] = measure(WINDOW_PROBE, args.runs)
+    else:
+        result["window"] = {"skipped": True, "error": "нет дисплея"}
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    failures = []
+    for name, limit in (("import", args.max_import_ms), ("window", args.max_window_ms)):
+        stats = result[name]
+        if stats.get("skipped"):
+            continue
+        if stats["heavy_modules"]:
+            failures.append(f"{name}: загружены при запуске {', '.join(stats['heavy_modules'])}")
+        if limit and stats["median_ms"] > limit:
+            failures.append(f"{name}: {stats['median_ms']} мс > {limit} мс")
+    for msg in failures:
+        print(f"REGRESSION {msg}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# 📦 Офлайн-замеры: добавление ролика, отрисовка списка, пакетная загрузка, сведение, история.
+# Сеть не нужна — всё отдаёт локальный FakeSite (см. fake_site.py).
+#   python benchmarks/suite.py [--out results.json] [--sizes 10,100,1000] [--downloads 8]
+# Результаты — JSON, чтобы сравнивать прогоны между собой.
+# Замеры окна (add_to_list, render_download_items) пропускаются, если Tk не может открыть окно
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_site import FakeSite, FakeExtractor, make_real_media, DEFAULT_VIDEO_BYTES, DEFAULT_AUDIO_BYTES
+from engine import DownloadEngine
+from meta_cache import MetadataCache
+from history_store import HistoryManager
+from scheduler import DONE
+from ranged import RANGED_CONNECTIONS
+
+
+def stats_ms(samples):
+    samples = [s * 1000 for s in samples]
+    return {
+        "n": len(samples),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def timed(func, *args):
+    t = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - t, result
+
+
+# --- разбор ссылки (фоновая часть «➕ Добавить») ---
+
+def bench_describe(fake, tmp, count):
+    engine = DownloadEngine(meta_cache=MetadataCache(os.path.join(tmp, "meta")), log=lambda msg: None)
+    urls = [fake.url(i) for i in range(count)]
+    cold = [timed(engine.describe, url)[0] for url in urls]
+    warm = [timed(engine.describe, url)[0] for url in urls]
+    engine.scheduler.shutdown()
+    return {"cold": stats_ms(cold), "warm_meta_cache": stats_ms(warm)}
+
+
+# --- окно ---
+
+def open_app(tmp):
+    try:
+        from tkinter import Tk
+        root = Tk()
+    except Exception as e:
+        return None, str(e)
+    from ui_sakura import SakuraDownloader
+    root.withdraw()
+    # Журнал, библиотека, история и кэши — во временной папке: настоящие файлы программы не трогаем
+    app = SakuraDownloader(root, data_dir=os.path.join(tmp, "app"))
+    root.update()
+    return app, None
+
+
+def wait_until(root, predicate, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("окно не дождалось результата")
+        root.update()
+        time.sleep(0.001)
+
+
+def bench_add_to_list(app, fake, count):
+    # От нажатия «➕ Добавить» до появления строки в списке
+    samples = []
+    for i in range(count):
+        before = len(app.download_items)
+        app.url.set(fake.url(100000 + i))
+        t = time.perf_counter()
+        app.add_to_list()
+        wait_until(app.root, lambda: len(app.download_items) > before)
+        app.root.update_idletasks()
+        samples.append(time.perf_counter() - t)
+    return stats_ms(samples)
+
+
+def bench_render(app, datas, sizes):
+    results = {}
+    render = app.render_download_items
+    for n in sizes:
+        app.download_items.clear()
+        app.render_download_items()
+        # Наполняем без промежуточных перерисовок — мерим только сам render
+        app.render_download_items = lambda: None
+        for data in datas[:n]:
+            app._insert_item(data)
+        app.render_download_items = render
+        first, _ = timed(lambda: (render(), app.root.update_idletasks()))
+        rerender, _ = timed(lambda: (render(), app.root.update_idletasks()))
+        app.vid_canvas.yview_moveto(0.5)
+        scroll, _ = timed(lambda: (app._sync_visible_rows(), app.root.update_idletasks()))
+        results[str(n)] = {
+            "first_ms": round(first * 1000, 3),
+            "rerender_ms": round(rerender * 1000, 3),
+            "scroll_ms": round(scroll * 1000, 3),
+        }
+    app.download_items.clear()
+    app.render_download_items()
+    return results
+
+
+# --- загрузка и сведение ---
+
+def bench_downloads(fake, tmp, count, workers, kind, connections):
+    out_dir = os.path.join(tmp, f"out_{kind}")
+    os.makedirs(out_dir, exist_ok=True)
+    engine = DownloadEngine(workers=workers, per_host=workers, meta_cache=MetadataCache(os.path.join(tmp, "meta")),
+                            log=lambda msg: None, connections=connections)
+    datas = [engine.describe(fake.url(200000 + i)) for i in range(count)]
+    t = time.perf_counter()
+    jobs = [engine.queue(data, kind, out_dir, format_label="137" if kind == "format" else "", dub="all")
+            for data in datas]
+    while engine.scheduler.pending():
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t
+    engine.scheduler.shutdown()
+    total = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+    errors = [str(job.error) for job in jobs if job.state != DONE]
+    return {
+        "items": count,
+        "workers": workers,
+        "connections": connections,
+        "seconds": round(elapsed, 3),
+        "bytes": total,
+        "mb_per_s": round(total / elapsed / 1024 / 1024, 2) if elapsed else None,
+        "items_per_s": round(count / elapsed, 2) if elapsed else None,
+        "failed": len(errors),
+        "errors": errors[:3],
+    }
+
+
+def bench_merge(media, tmp, repeats):
+    from media import mux
+    out = os.path.join(tmp, "merged.mp4")
+    tracks = [
+        {"path": media["audio"], "acodec": "mp4a.40.2", "lang": "en", "title": "Original"},
+        {"path": media["audio"], "acodec": "mp4a.40.2", "lang": "ru", "title": "Русский (dubbed)"},
+    ]
+    samples = [timed(mux, media["video"], tracks, out, "avc1")[0] for _ in range(repeats)]
+    return stats_ms(samples)
+
+
+# --- история ---
+
+def bench_history(tmp, count):
+    path = os.path.join(tmp, "history.sqlite3")
+    history = HistoryManager(path, json_path=os.path.join(tmp, "none.json"))
+    base = "https://www.youtube.com/watch?v="
+    adds = [timed(history.add, f"{base}h{i:010d}", f"https://i.ytimg.com/vi/h{i:010d}/default.jpg", f"Video {i}")[0]
+            for i in range(count)]
+    readd = [timed(history.add, f"{base}h{i:010d}", "", "")[0] for i in range(0, count, max(1, count // 100))]
+    page = [timed(history.page, 0, 50)[0] for _ in range(20)]
+    last_page = [timed(history.page, max(0, count - 50), 50)[0] for _ in range(20)]
+    search = [timed(history.page, 0, 50, "Video 12")[0] for _ in range(20)]
+    history.close()
+    return {
+        "entries": count,
+        "add": stats_ms(adds),
+        "re_add": stats_ms(readd),
+        "page_first": stats_ms(page),
+        "page_last": stats_ms(last_page),
+        "search": stats_ms(search),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-замеры Sakura Downloader")
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию — только stdout)")
+    parser.add_argument("--sizes", default="10,100,1000", help="размеры списка для замера отрисовки")
+    parser.add_argument("--describe", type=int, default=50, help="сколько ссылок разобрать")
+    parser.add_argument("--add", type=int, default=20, help="сколько раз нажать «Добавить»")
+    parser.add_argument("--downloads", type=int, default=8, help="роликов в пакетной загрузке")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=RANGED_CONNECTIONS, help="соединений на один большой файл")
+    parser.add_argument("--video-mb", type=float, default=DEFAULT_VIDEO_BYTES / 1024 / 1024)
+    parser.add_argument("--audio-mb", type=float, default=DEFAULT_AUDIO_BYTES / 1024 / 1024)
+    parser.add_argument("--extra-formats", type=int, default=20, help="дополнительных видеоформатов у ролика")
+    parser.add_argument("--subtitles", default="en,ru,de,fr")
+    parser.add_argument("--dubs", default="ru,es")
+    parser.add_argument("--history", type=int, default=5000, help="записей в истории")
+    parser.add_argument("--merges", type=int, default=5)
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    tmp = tempfile.mkdtemp(prefix="sakura-bench-")
+    media = make_real_media(os.path.join(tmp, "media"))
+    site = FakeSite(int(args.video_mb * 1024 * 1024), int(args.audio_mb * 1024 * 1024), real_media=media).start()
+    fake = FakeExtractor(
+        site,
+        extra_video_formats=args.extra_formats,
+        subtitles=tuple(s for s in args.subtitles.split(",") if s),
+        dubs=tuple(s for s in args.dubs.split(",") if s),
+    ).install()
+
+    results = {}
+    try:
+        results["describe"] = bench_describe(fake, tmp, args.describe)
+
+        app, error = open_app(tmp)
+        if app is None:
+            results["add_to_list"] = results["render_download_items"] = {"skipped": True, "error": error}
+        else:
+            results["add_to_list"] = bench_add_to_list(app, fake, args.add)
+            datas = [app.engine.describe(fake.url(i)) for i in range(max(sizes or [0]))]
+            results["render_download_items"] = bench_render(app, datas, sizes)
+            app.root.destroy()
+
+        results["download_format"] = bench_downloads(fake, tmp, args.downloads, args.workers, "format", args.connections)
+        if media:
+            results["download_best"] = bench_downloads(fake, tmp, args.downloads, args.workers, "best", args.connections)
+            results["merge"] = bench_merge(media, tmp, args.merges)
+        else:
+            results["download_best"] = results["merge"] = {"skipped": True, "error": "ffmpeg не найден"}
+
+        results["history"] = bench_history(tmp, args.history)
+    finally:
+        fake.uninstall()
+        site.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# 📦 Консольный режим: пакетная загрузка без окна (для headless-сервера)
+#   python main.py URL [URL ...] -o DIR [--workers N] [--mode best|format|audio] [--json]
+#   python main.py -i links.txt -o DIR
+#   python main.py --daemon -o DIR   # ссылки читаются из stdin по мере поступления
+import sys
+import json
+import time
+import argparse
+import threading
+
+from engine import DownloadEngine, DEFAULT_AUDIO_FORMAT
+from media import AUDIO_FORMATS
+from ranged import RANGED_CONNECTIONS
+from ingest import BulkIngestor, parse_bulk_text, read_url_file, INGEST_WORKERS
+from journal import JobJournal
+from library import LibraryIndex
+from meta_cache import cache_key
+from metrics import Metrics, SamplingProfiler
+from scheduler import DEFAULT_WORKERS, DEFAULT_PER_HOST, DEFAULT_POST_WORKERS, DONE, FAILED, CANCELLED, RUNNING
+
+PROGRESS_INTERVAL = 1.0  # не чаще раза в секунду на задачу
+METRICS_INTERVAL = 5.0   # как часто переписывать файл --metrics
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Sakura Downloader — консольный режим")
+    parser.add_argument("urls", nargs="*", help="ссылки на ролики, плейлисты или каналы")
+    parser.add_argument("-i", "--input", action="append", default=[], help="файл со ссылками ('-' — stdin)")
+    parser.add_argument("-o", "--output", default=".", help="папка для файлов")
+    parser.add_argument("--mode", choices=("best", "format", "audio"), default="best",
+                        help="best — лучшее видео + звук (+ дубляж); format — один формат yt-dlp; audio — только звук")
+    parser.add_argument("--format", default="bv*+ba/b", help="селектор формата для --mode format")
+    parser.add_argument("--audio-format", choices=tuple(AUDIO_FORMATS), default=DEFAULT_AUDIO_FORMAT,
+                        help="во что сохранять звук для --mode audio")
+    parser.add_argument("--dub", default="", help="язык дубляжа, подпись дорожки или 'all'")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="одновременных загрузок")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="одновременных загрузок с одного сайта")
+    parser.add_argument("--merge-workers", type=int, default=DEFAULT_POST_WORKERS,
+                        help="одновременных сведений и извлечений звука ffmpeg (по умолчанию — число ядер)")
+    parser.add_argument("--connections", type=int, default=RANGED_CONNECTIONS,
+                        help="соединений на один большой файл (1 — без деления на диапазоны)")
+    parser.add_argument("--journal", help="файл журнала задач (SQLite) для докачки после перезапуска")
+    parser.add_argument("--library", help="индекс скачанного (SQLite): что уже есть, повторно не качается")
+    parser.add_argument("--rescan", action="append", default=[],
+                        help="пересобрать индекс библиотеки по папке перед загрузкой (можно несколько)")
+    parser.add_argument("--daemon", action="store_true", help="читать ссылки из stdin, пока он не закроется")
+    parser.add_argument("--json", action="store_true", help="события построчно в JSON")
+    parser.add_argument("--trace", help="дописывать интервалы этапов в файл JSON Lines")
+    parser.add_argument("--metrics", help="файл метрик в текстовом формате Prometheus")
+    parser.add_argument("--profile", help="снимать стеки во время пакета и сохранить свёрнутые стеки в файл")
+    return parser.parse_args(argv)
+
+
+class Reporter:
+    # Вывод событий: человекочитаемо или JSON Lines; вызывается из разных потоков
+    def __init__(self, as_json):
+        self.as_json = as_json
+        self._lock = threading.Lock()
+        self._last_progress = {}
+
+    def emit(self, event, **fields):
+        with self._lock:
+            if self.as_json:
+                line = json.dumps(dict(fields, event=event, ts=round(time.time(), 3)), ensure_ascii=False, default=str)
+            else:
+                line = f"[{event}] " + " ".join(f"{k}={v}" for k, v in fields.items() if v not in (None, ""))
+            print(line, flush=True)
+
+    def log(self, msg):
+        self.emit("log", message=msg)
+
+    def job(self, job):
+        if job.state == RUNNING:
+            now = time.time()
+            if now - self._last_progress.get(job.key, 0) < PROGRESS_INTERVAL:
+                return
+            self._last_progress[job.key] = now
+            self.emit(
+                "progress", url=job.key, percent=job.progress.get("percent"), speed=job.progress.get("speed"),
+                downloaded_bytes=job.progress.get("downloaded_bytes"), total_bytes=job.progress.get("total_bytes"),
+            )
+        else:
+            self.emit("state", url=job.key, state=job.state, error=job.error)
+
+
+def run_cli(argv):
+    args = parse_args(argv)
+    reporter = Reporter(args.json)
+    metrics = Metrics(trace_path=args.trace)
+    profiler = SamplingProfiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    library = LibraryIndex(args.library) if args.library or args.rescan else None
+    if library and args.rescan:
+        library.rescan(args.rescan, reporter.log)
+    engine = DownloadEngine(
+        workers=args.workers,
+        per_host=args.per_host,
+        post_workers=args.merge_workers,
+        on_update=reporter.job,
+        log=reporter.log,
+        journal=JobJournal(args.journal) if args.journal else None,
+        metrics=metrics,
+        connections=args.connections,
+        library=library,
+    )
+    fmt = {"format": args.format, "audio": args.audio_format}.get(args.mode, "")
+
+    def queue(data):
+        engine.queue(data, args.mode, args.output, format_label=fmt, dub=args.dub)
+
+    ingest_failed = []
+
+    def on_error(url, error):
+        # Ссылка не разобралась — до очереди загрузок она не дошла
+        ingest_failed.append(url)
+        reporter.emit("state", url=url, state=FAILED, error=error)
+
+    # Незавершённые задачи из журнала — первыми
+    if engine.journal:
+        for row in engine.journal.given_up():
+            reporter.log(f"Не возобновляется после {row['attempts']} неудач: {row['url']} ({row['error']})")
+        for row in engine.journal.unfinished():
+            try:
+                engine.queue(engine.describe(row["url"]), row["kind"], row["out_dir"],
+                             format_label=row["format_label"], dub=row["dub"])
+            except Exception as e:
+                on_error(row["url"], e)
+
+    urls = list(args.urls)
+    for path in args.input:
+        urls += parse_bulk_text(sys.stdin.read()) if path == "-" else read_url_file(path)
+
+    # Один разборщик на все пачки: в режиме демона дубликаты отсекаются и между ними
+    # и один поток разбора: строки stdin только встают в его очередь
+    ingestor = BulkIngestor(engine.describe, queue, on_error, workers=INGEST_WORKERS)
+    ingestor.start(urls, known_keys=[cache_key(url) for url in engine.scheduler.jobs])
+    if args.daemon:
+        for line in sys.stdin:
+            batch = parse_bulk_text(line)
+            if batch:
+                ingestor.start(batch)
+    ingestor.close()
+    if not urls and not args.daemon and not engine.scheduler.jobs:
+        reporter.emit("error", message="нет ссылок: укажите URL, -i FILE или --daemon")
+        return 2
+
+    ingestor.join()
+    last_write = time.time()
+    while engine.scheduler.pending():
+        time.sleep(0.2)
+        if args.metrics and time.time() - last_write >= METRICS_INTERVAL:
+            metrics.write_prometheus(args.metrics)
+            last_write = time.time()
+
+    if args.metrics:
+        metrics.write_prometheus(args.metrics)
+    metrics.set_trace(None)
+    if profiler:
+        profiler.stop()
+        profiler.write(args.profile)
+        reporter.emit("profile", path=args.profile, samples=profiler.samples,
+                      hot="; ".join(f"{name} ({count})" for name, count in profiler.hot(5)))
+
+    states = [job.state for job in engine.scheduler.jobs.values()]
+    failed = states.count(FAILED) + len(ingest_failed)
+    reporter.emit(
+        "summary",
+        done=states.count(DONE),
+        failed=failed,
+        cancelled=states.count(CANCELLED),
+        reused=engine.library_hits,
+    )
+    return 1 if failed else 0
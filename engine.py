@@ -0,0 +1,645 @@
+# 📦 Движок загрузки без интерфейса: разбор ссылки, загрузка потоков, сведение.
+# Не импортирует tkinter, PIL и pywebview — им пользуются и окно, и консольный режим (cli.py).
+# yt_dlp импортируется при первой загрузке (или заранее в фоне, см. warm_up)
+import os
+import re
+import time
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import shared_client
+from meta_cache import MetadataCache
+from models import FormatTable, DUB_ALL_LABEL
+from media import mux, extract_audio, AUDIO_FORMATS, STREAM_CHUNK
+from ranged import RangedDownload, RangeNotSupported, probe_size, part_files, media_client, RANGED_CONNECTIONS, RANGED_MIN_SIZE
+from metrics import Metrics
+from scheduler import DownloadScheduler, DEFAULT_WORKERS, DEFAULT_PER_HOST, DEFAULT_POST_WORKERS, JobCancelled, CANCELLED, FAILED
+
+# ffmpeg_dir = r"D:\github\z3552_inj_prog\ffmpeg\bin"
+ffmpeg_dir = os.path.join(os.path.dirname(__file__), "ffmpeg", "bin")
+if ffmpeg_dir not in os.environ.get("PATH", ""):
+    os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
+
+def sanitize_filename(filename):
+    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+
+
+def output_base(data):
+    # Имя файла без расширения: «Название [ID]», как у yt-dlp по умолчанию —
+    # ролики с одинаковым названием не затирают друг друга
+    if data.get("video_id"):
+        return sanitize_filename(f"{data['title_base']} [{data['video_id']}]")
+    return sanitize_filename(data["title_base"])
+
+
+def library_key(data, kind, format_label="", dub=""):
+    # (ID ролика, ID формата, дубляж) для библиотеки готовых файлов; None — не индексируем
+    table = data["formats"]
+    if not data.get("video_id"):
+        return None
+    if kind == "format":
+        single = table.find(format_label)
+        return data["video_id"], single.format_id if single else format_label, ""
+    if kind == "audio":
+        if not table.best_audio:
+            return None
+        return data["video_id"], f"{table.best_audio.format_id}>{format_label or DEFAULT_AUDIO_FORMAT}", ""
+    if not (table.best_video and table.best_audio):
+        return None
+    dubs = ",".join(sorted(f.language or f.format_id for _, f in table.select_dubs(dub)))
+    return data["video_id"], f"{table.best_video.format_id}+{table.best_audio.format_id}", dubs
+
+
+class YTDLLogger:
+    def __init__(self, log_func):
+        self.log_func = log_func
+    def debug(self, msg):
+        pass
+    def warning(self, msg):
+        self.log_func(f"[yt-dlp] WARNING: {msg}")
+    def error(self, msg):
+        self.log_func(f"[yt-dlp] ERROR: {msg}")
+
+
+def ytdl_hook(d, log_func):
+    if d['status'] == 'downloading':
+        percent = d.get('_percent_str', '').strip()
+        speed = d.get('_speed_str', '').strip()
+        eta = d.get('_eta_str', '').strip()
+        line = f"[download] {percent} of {d.get('total_bytes_str','?')} at {speed} ETA {eta}"
+        log_func(line)
+    elif d['status'] == 'finished':
+        log_func(f"[download] Done: {d.get('filename','')}")
+
+
+def fetch_ranged(ydl, fmt, path, connections):
+    # Большой файл по прямой ссылке — в несколько соединений (см. ranged.py).
+    # False — не подходит (маленький, фрагментированный, сервер не отдаёт диапазоны): качает yt-dlp
+    if connections < 2 or fmt.get("protocol") not in ("http", "https") or not fmt.get("url"):
+        return False
+    known = fmt.get("filesize") or fmt.get("filesize_approx")
+    if known and known < RANGED_MIN_SIZE:
+        return False
+    headers = fmt.get("http_headers") or {}
+    try:
+        total = probe_size(fmt["url"], headers)
+    except RangeNotSupported:
+        return False
+    if total < RANGED_MIN_SIZE:
+        return False
+    if os.path.exists(path) and os.path.getsize(path) == total:
+        # Уже скачан целиком (повтор после падения на сведении, запуск без библиотеки) —
+        # как и yt-dlp, готовый файл заново не качаем
+        return True
+    hooks = ydl.params.get("progress_hooks") or []
+
+    def hook(d):
+        for h in hooks:
+            h(d)
+    try:
+        RangedDownload(fmt["url"], path, total, headers, connections, hook).run()
+    except RangeNotSupported:
+        remove_files(part_files(path))
+        return False
+    return True
+
+
+def split_connections(connections, count):
+    # Бюджет соединений задачи на count потоков: поровну, остаток — первым (видео идёт первым)
+    return [max(1, connections // count + (1 if i < connections % count else 0)) for i in range(count)]
+
+
+def download_streams(ydl_opts, info, streams, on_stream_done=None, connections=1):
+    # streams: [(format_dict, путь)]; все потоки одной сессии качаются одновременно.
+    # connections — бюджет на всю задачу: он делится между потоками (и на диапазоны,
+    # и на фрагменты DASH/HLS), так что задача не открывает потоки × connections соединений.
+    # У каждого потока свой YoutubeDL: один экземпляр из нескольких потоков использовать нельзя.
+    # Недокачанные .part / .ranged остаются на диске, и повторный запуск продолжает с того же места
+    import yt_dlp
+    errors = []
+
+    def fetch(fmt, path, share):
+        fmt_info = {k: v for k, v in info.items() if k not in ("formats", "requested_formats", "requested_downloads")}
+        fmt_info.update(fmt)
+        try:
+            with yt_dlp.YoutubeDL(dict(ydl_opts, concurrent_fragment_downloads=share)) as ydl:
+                if fetch_ranged(ydl, fmt, path, share):
+                    if on_stream_done:
+                        on_stream_done(path)
+                    return
+                success, _ = ydl.dl(path, fmt_info)
+            if not success:
+                errors.append(RuntimeError(f"не удалось скачать формат {fmt.get('format_id')}"))
+            elif on_stream_done:
+                on_stream_done(path)
+        except Exception as e:
+            errors.append(e)
+
+    shares = split_connections(connections, len(streams))
+    threads = [threading.Thread(target=fetch, args=(fmt, path, share), daemon=True)
+               for (fmt, path), share in zip(streams, shares)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def remove_files(paths):
+    # Временные файлы вместе с недокачанными .part и .ranged
+    for path in paths:
+        for f in [path, path + ".part"] + part_files(path):
+            try:
+                if os.path.exists(f):
+                    os.remove(f)
+            except Exception:
+                pass
+
+
+DEFAULT_AUDIO_FORMAT = "mp3"
+JOB_KIND_NAMES = {"format": "выбранный формат", "best": "лучшее качество", "audio": "только звук"}
+STREAMABLE_PROTOCOLS = ("http", "https")  # эти потоки идут в ffmpeg через наш пул соединений
+AUDIO_REPORT_INTERVAL = 0.5
+
+
+LIST_THUMB_WIDTH = 120  # ширина миниатюры в списке и истории не больше этой
+PREVIEW_CHECK_WORKERS = 8
+# Стандартные превью YouTube без размеров в thumbnails — от крупного к мелкому
+YOUTUBE_THUMB_NAMES = ("maxresdefault", "sddefault", "hqdefault", "mqdefault", "default")
+
+
+def _is_webp(thumb):
+    return ".webp" in thumb["url"].split("?")[0] or "/vi_webp/" in thumb["url"]
+
+
+def _thumb_label(t):
+    # Подпись варианта: размер, resolution от экстрактора или имя стандартного превью YouTube.
+    # Без всего этого вариант не показываем — номер из списка пользователю ни о чём не говорит
+    w, h = t.get("width"), t.get("height")
+    if w and h:
+        return f"{w}x{h}"
+    if t.get("resolution"):
+        return str(t["resolution"])
+    name = t["url"].split("?")[0].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return name if name in YOUTUBE_THUMB_NAMES else None
+
+
+def preview_choices(info):
+    # Варианты превью из списка thumbnails самого экстрактора — без запросов к сети.
+    # Одинаковые размеры схлопываются (jpg предпочтительнее webp), крупные — первыми
+    thumbs = [t for t in info.get("thumbnails") or [] if t.get("url")]
+    by_label = {}
+    for t in thumbs:
+        label = _thumb_label(t)
+        if not label:
+            continue
+        prev = by_label.get(label)
+        if prev is None or (_is_webp(prev), -(prev.get("preference") or 0)) > (_is_webp(t), -(t.get("preference") or 0)):
+            by_label[label] = t
+    if not by_label and info.get("thumbnail"):
+        # Сайт отдал одну картинку без подробностей — её и предлагаем
+        by_label["original"] = {"url": info["thumbnail"]}
+
+    def order(kv):
+        label, t = kv
+        size = re.fullmatch(r"(\d+)x(\d+)", label)
+        area = int(size.group(1)) * int(size.group(2)) if size else 0
+        rank = YOUTUBE_THUMB_NAMES.index(label) if label in YOUTUBE_THUMB_NAMES else len(YOUTUBE_THUMB_NAMES)
+        return -area, rank
+    return [(label, t["url"]) for label, t in sorted(by_label.items(), key=order)]
+
+
+def list_thumb_url(info, choices):
+    # Для списка хватает самой маленькой миниатюры не уже LIST_THUMB_WIDTH
+    sized = [t for t in info.get("thumbnails") or [] if t.get("url") and t.get("width")]
+    fitting = [t for t in sized if t["width"] >= LIST_THUMB_WIDTH and not _is_webp(t)]
+    if fitting:
+        return min(fitting, key=lambda t: t["width"])["url"]
+    return info.get("thumbnail") or (choices[0][1] if choices else "")
+
+
+def check_previews(choices, http=None):
+    # Необязательная проверка: параллельные HEAD-запросы, тела картинок не скачиваются.
+    # Окно зовёт её лениво — при первом открытии меню превью, а не при разборе ссылки
+    http = http or shared_client()
+
+    def exists(choice):
+        try:
+            return http.head(choice[1]).status_code == 200
+        except Exception:
+            return False
+
+    if not choices:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PREVIEW_CHECK_WORKERS, len(choices))) as pool:
+        flags = list(pool.map(exists, choices))
+    return [choice for choice, ok in zip(choices, flags) if ok]
+
+
+def _span(metrics, key, stage):
+    return metrics.span(key, stage) if metrics else nullcontext()
+
+
+def describe_video(url, meta_cache, metrics=None):
+    # Всё, что не требует Tk: метаданные, превью, списки форматов и субтитров
+    with _span(metrics, url, "extract"):
+        info = meta_cache.extract(url)
+    title = info.get("title", url)
+    video_id = info.get("id")
+    available_previews = preview_choices(info)
+
+    # Форматы: показывать ВСЁ, что есть (и с аудио, и без) — компактной таблицей с индексами
+    table = FormatTable(info.get("formats"))
+
+    subtitles = info.get("subtitles", {})
+    subtitle_choices = []
+    subtitle_map = {}
+    for lang, tracks in subtitles.items():
+        for track in tracks:
+            ext = track.get("ext", "vtt")
+            name = f"{lang} ({ext})"
+            subtitle_choices.append(name)
+            subtitle_map[name] = {"lang": lang, "ext": ext}
+
+    return {
+        "url": url,
+        "video_id": video_id,
+        "title_base": title,
+        "title": title,
+        "thumb_url": list_thumb_url(info, available_previews),
+        "formats": table,
+        "preview_choices": available_previews,
+        "subtitle_choices": subtitle_choices,
+        "subtitle_map": subtitle_map,
+    }
+
+
+def download_subtitles(data, sub_name, out_dir, log=print):
+    sub_info = data["subtitle_map"].get(sub_name)
+    if not sub_info:
+        raise ValueError("Не выбран язык субтитров.")
+    safe_title = output_base(data)
+    ydl_opts = {
+        'skip_download': True,
+        'writesubtitles': True,
+        'subtitleslangs': [sub_info["lang"]],
+        'subtitlesformat': sub_info["ext"],
+        'outtmpl': os.path.join(out_dir, f'{safe_title}.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'logger': YTDLLogger(log),
+    }
+    import yt_dlp
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([data["url"]])
+
+
+def warm_up():
+    # Импорт yt_dlp занимает заметную часть запуска: окно вызывает это в фоне после показа
+    import yt_dlp
+    import requests
+
+
+class DownloadEngine:
+    # on_update(job), log(msg) и trace(msg) вызываются из рабочих потоков.
+    # trace получает построчный прогресс yt-dlp; по умолчанию он никуда не пишется —
+    # состояние загрузки и так доступно в job.progress
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, on_update=None, log=print,
+                 journal=None, meta_cache=None, check_previews=False, trace=None, post_workers=DEFAULT_POST_WORKERS,
+                 metrics=None, connections=RANGED_CONNECTIONS, library=None):
+        self.on_update = on_update
+        self.log = log
+        self.trace = trace
+        self.journal = journal
+        self.meta_cache = meta_cache or MetadataCache()
+        self.check_previews = check_previews  # HEAD-проверка вариантов превью при открытии меню, см. verify_previews
+        self.connections = connections  # соединений на один файл (диапазоны или фрагменты)
+        self.library = library  # LibraryIndex: уже скачанное не качается повторно
+        self.library_hits = 0
+        self.scheduler = DownloadScheduler(workers=workers, per_host=per_host, on_update=self._on_update,
+                                           post_workers=post_workers)
+        # Интервалы этапов, байты и глубина очереди (см. metrics.py)
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("queue_depth", self.scheduler.counts)
+        # Извлечение звука — это ffmpeg, поэтому одновременно не больше, чем сведений (по числу ядер)
+        self._audio_slots = threading.BoundedSemaphore(max(1, post_workers))
+        self._kinds = {}  # ключ задачи -> kind, с которым она поставлена
+
+    def describe(self, url):
+        return describe_video(url, self.meta_cache, self.metrics)
+
+    def verify_previews(self, key, choices):
+        # Из фонового потока: варианты превью, которые реально отвечают. Если не ответил ни один
+        # (нет сети), список остаётся прежним — пустое меню хуже непроверенного
+        if not self.check_previews:
+            return choices
+        with self.metrics.span(key, "previews"):
+            checked = check_previews(choices)
+        return checked or choices
+
+    def queue(self, data, kind, out_dir, format_label="", dub="", subtitle="", priority=0):
+        # kind: "format" — выбранный формат, "best" — лучшее видео + звук (+ дубляж),
+        # "audio" — только звук; format_label тогда — целевой формат ("mp3" или "opus")
+        # Задача одна на ссылку: пока идёт одна, другая для того же ролика не ставится
+        key = data["url"]
+        job = self.scheduler.jobs.get(key)
+        if job and not job.finished:
+            running = self._kinds.get(key, kind)
+            if running != kind:
+                self.log(f"Не поставлено ({JOB_KIND_NAMES.get(kind, kind)}): для «{data['title']}» уже идёт загрузка "
+                         f"({JOB_KIND_NAMES.get(running, running)}) — дождитесь её или отмените")
+            return job
+        self._kinds[key] = kind
+        if self.journal:
+            self.journal.record(key, data["url"], kind, out_dir, data["title"], format_label, dub, subtitle)
+        self.metrics.set_title(key, data["title"])
+
+        lib_key = library_key(data, kind, format_label, dub) if self.library else None
+
+        def run(job):
+            self.metrics.record(job.key, "queue", job.created, job.started or time.time())
+            if lib_key and self._reuse(data, lib_key, out_dir, job):
+                return
+            if kind == "format":
+                return self._run_format(data, out_dir, format_label, job, lib_key)
+            if kind == "audio":
+                return self._run_audio(data, out_dir, format_label or DEFAULT_AUDIO_FORMAT, job, lib_key)
+            return self._run_best(data, out_dir, dub, job, lib_key)
+        return self.scheduler.submit(key, run, data["url"], priority=priority)
+
+    def _reuse(self, data, lib_key, out_dir, job):
+        # Уже есть в библиотеке: в той же папке — ничего не делаем, в другой — жёсткая ссылка
+        row = self.library.lookup(*lib_key, prefer_dir=out_dir)
+        if not row:
+            return False
+        with self.metrics.span(job.key, "library"):
+            path, placed = self.library.reuse(row, out_dir)
+        self.library_hits += 1
+        self._stage(job, "done")
+        if placed:
+            self.log(f"Уже скачано, взято из библиотеки: {path}")
+        else:
+            self.log(f"Уже скачано, пропуск: {data['title']}")
+        return True
+
+    def _remember(self, lib_key, path, job):
+        # Готовый файл — в библиотеку (с контрольной суммой); ошибка индекса загрузку не портит
+        if not (self.library and lib_key and path):
+            return
+        try:
+            with self.metrics.span(job.key, "library"):
+                self.library.add(*lib_key, path)
+        except Exception as e:
+            self.log(f"Не удалось добавить в библиотеку {path}: {e}")
+
+    def _stage(self, job, stage):
+        if self.journal:
+            self.journal.set_stage(job.key, stage)
+
+    def _on_update(self, job):
+        if self.journal:
+            if job.state == FAILED:
+                self.journal.set_error(job.key, job.error)
+            elif job.state == CANCELLED:
+                self.journal.remove(job.key)
+        if self.on_update:
+            self.on_update(job)
+
+    def _hook(self, job):
+        # Потоки одной задачи (видео, звук, дубляжи) качаются параллельно, поэтому прогресс —
+        # сумма по всем файлам из job.streams, а не цифры того потока, что сообщил последним.
+        # Файл, скачанный по диапазонам, yt-dlp потом видит готовым и сообщает «finished» ещё раз
+        finished = set()
+        lock = threading.Lock()
+
+        def hook(d):
+            job.check()
+            name = d.get("filename")
+            if d["status"] == "downloading":
+                with lock:
+                    job.streams[name] = [
+                        d.get("downloaded_bytes") or 0,
+                        d.get("total_bytes") or d.get("total_bytes_estimate") or 0,
+                        d.get("speed") or 0,
+                    ]
+                    self._report_streams(job)
+                if self.trace:
+                    ytdl_hook(d, self.trace)
+            elif d["status"] == "finished" and name not in finished:
+                finished.add(name)
+                size = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+                with lock:
+                    job.streams[name] = [size, size, 0]
+                    self._report_streams(job)
+                self.metrics.add_bytes(job.key, size)
+                ytdl_hook(d, self.log)
+        return hook
+
+    def _report_streams(self, job):
+        done = sum(s[0] for s in job.streams.values())
+        total = sum(s[1] for s in job.streams.values())
+        speed = sum(s[2] for s in job.streams.values())
+        self.scheduler.report(
+            job,
+            percent=f"{min(done * 100 / total, 100):.1f}%" if total else "",
+            speed=f"{speed / 1024 / 1024:.2f}MiB/s" if speed else "",
+            downloaded_bytes=done,
+            total_bytes=total or None,
+        )
+
+    def _run_format(self, data, out_dir, format_label, job, lib_key=None):
+        # Очистка имени файла
+        safe_title = output_base(data)
+        ydl_opts = {
+            'outtmpl': os.path.join(out_dir, f'{safe_title}.%(ext)s'),
+            # Подпись из меню или готовый селектор формата yt-dlp
+            'format': data["formats"].format_id(format_label),
+            'quiet': True,
+            'noplaylist': True,
+            'no_warnings': True,
+            'logger': YTDLLogger(self.log),
+            'progress_hooks': [self._hook(job)],
+            # DASH/HLS: фрагменты — параллельно в то же число соединений
+            'concurrent_fragment_downloads': self.connections,
+        }
+        # yt-dlp сам докачивает .part, оставшийся от прерванного запуска
+        self._stage(job, "video")
+        single = data["formats"].find(format_label)
+        import yt_dlp
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl, self.metrics.span(job.key, "download"):
+            if single and self.connections > 1:
+                # Один конкретный формат: большой файл по прямой ссылке сначала качаем сами,
+                # в несколько соединений, под тем именем, которое выбрал бы yt-dlp
+                info = ydl.extract_info(data["url"], download=False)
+                fmt = next((f for f in info.get("formats") or [] if f.get("format_id") == single.format_id), None)
+                if not fmt:
+                    raise RuntimeError(f"Формат {single.format_id} больше недоступен.")
+                if fetch_ranged(ydl, fmt, ydl.prepare_filename(dict(info, **fmt)), self.connections):
+                    # Готовый файл yt-dlp не качает заново, но исправления (fixup) и постпроцессоры
+                    # к нему применяет — для этого файл надо считать «настоящей» загрузкой
+                    ydl.params["fixup"] = "force"
+                # Не подошёл (фрагменты, маленький, нет диапазонов) — yt-dlp качает сам, как обычно
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(data["url"], download=True)
+            path = ((info or {}).get("requested_downloads") or [{}])[0].get("filepath")
+        self._remember(lib_key, path, job)
+        self._stage(job, "done")
+        self.log(f"Скачано видео: {data['title']}")
+
+    def _run_best(self, data, out_dir, dub, job, lib_key=None):
+        safe_title = output_base(data)
+        table = data["formats"]
+        best_video, best_audio = table.best_video, table.best_audio
+        if not (best_video and best_audio):
+            raise RuntimeError("Не удалось найти подходящие видео и аудио потоки.")
+
+        # Выбранный дубляж идёт первой дорожкой, оригинал — второй;
+        # «Все дорожки» — оригинал и все дубляжи
+        dubs = table.select_dubs(dub)
+
+        video_path = os.path.join(out_dir, f"{safe_title}_video.{best_video.ext or 'mp4'}")
+        audio_path = os.path.join(out_dir, f"{safe_title}_audio.{best_audio.ext or 'm4a'}")
+        out_path = os.path.join(out_dir, f"{safe_title}.mp4")
+        # ffmpeg пишет во временный файл: итоговый может быть жёсткой ссылкой из библиотеки,
+        # и запись поверх него испортила бы все копии
+        merging_path = os.path.join(out_dir, f"{safe_title}.merging.mp4")
+        audio_tracks = [{
+            "format_id": best_audio.format_id,
+            "path": audio_path,
+            "lang": best_audio.language,
+            "title": "Original",
+        }]
+        for label, track in dubs:
+            audio_tracks.append({
+                "format_id": track.format_id,
+                "path": os.path.join(out_dir, f"{safe_title}_dub_{track.language or track.format_id}.{track.ext}"),
+                "lang": track.language,
+                "title": label,
+            })
+        if len(dubs) == 1:
+            audio_tracks.reverse()
+
+        ydl_opts = {
+            'quiet': True,
+            'noplaylist': True,
+            'no_warnings': True,
+            'logger': YTDLLogger(self.log),
+            'progress_hooks': [self._hook(job)],
+            # Соединения (и на фрагменты DASH/HLS) download_streams делит между потоками сам
+        }
+        temp_files = [video_path] + [track["path"] for track in audio_tracks]
+
+        def stream_done(path):
+            if path == video_path:
+                self._stage(job, "audio")
+
+        import yt_dlp
+        try:
+            # Одна сессия: одно извлечение, видео качается один раз, все дорожки — параллельно
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with self.metrics.span(job.key, "extract"):
+                    info = ydl.extract_info(data["url"], download=False)
+                self._stage(job, "video")
+                formats = {f["format_id"]: f for f in info.get("formats") or []}
+                streams = [(formats[best_video.format_id], video_path)]
+                streams += [(formats[track["format_id"]], track["path"]) for track in audio_tracks]
+                with self.metrics.span(job.key, "download", streams=len(streams)):
+                    download_streams(ydl_opts, info, streams, stream_done, self.connections)
+        except JobCancelled:
+            remove_files(temp_files)
+            raise
+        self._stage(job, "merge")
+        for track in audio_tracks:
+            track["acodec"] = formats[track["format_id"]].get("acodec")
+        vcodec = formats[best_video.format_id].get("vcodec")
+        handed_off = time.time()
+
+        def merge():
+            # Выполняется в очереди сведения: воркер загрузки к этому времени уже свободен.
+            # Итоговый файл — одним вызовом ffmpeg прямо из скачанных потоков
+            self.metrics.record(job.key, "merge_queue", handed_off, time.time())
+            with self.metrics.span(job.key, "merge", tracks=len(audio_tracks)):
+                merged = mux(video_path, audio_tracks, merging_path, vcodec, should_stop=lambda: job.cancelled)
+            if not merged:
+                remove_files(temp_files + [merging_path])
+                raise JobCancelled(job.key)
+            # При ошибке временные файлы остаются — по журналу задача докачается
+            os.replace(merging_path, out_path)
+            remove_files(temp_files)
+            self._remember(lib_key, out_path, job)
+            self._stage(job, "done")
+            self.log(f"Скачано видео: {data['title']}")
+        return merge
+
+    def _run_audio(self, data, out_dir, target, job, lib_key=None):
+        if target not in AUDIO_FORMATS:
+            raise ValueError(f"Неизвестный формат звука: {target}")
+        best_audio = data["formats"].best_audio
+        if not best_audio:
+            raise RuntimeError("Не удалось найти аудиопоток.")
+        out_path = os.path.join(out_dir, f"{output_base(data)}.{target}")
+        part_path = out_path + ".part"
+
+        # Ссылки на потоки живут недолго — берём свежие, как и в _run_best
+        import yt_dlp
+        ydl_opts = {'quiet': True, 'noplaylist': True, 'no_warnings': True, 'logger': YTDLLogger(self.log)}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl, self.metrics.span(job.key, "extract"):
+            info = ydl.extract_info(data["url"], download=False)
+        fmt = next((f for f in info.get("formats") or [] if f.get("format_id") == best_audio.format_id), None)
+        if not fmt or not fmt.get("url"):
+            raise RuntimeError(f"Формат {best_audio.format_id} больше недоступен.")
+        headers = fmt.get("http_headers") or {}
+        streamable = (fmt.get("protocol") or "https") in STREAMABLE_PROTOCOLS
+
+        self._stage(job, "audio")
+        job.check()
+        os.makedirs(out_dir, exist_ok=True)
+        # Поток сразу идёт в ffmpeg, на диск пишется только готовый файл
+        with self._audio_slots, self.metrics.span(job.key, "download", target=target):
+            try:
+                if streamable:
+                    chunks = self._audio_chunks(fmt, headers, job)
+                    extract_audio(chunks, target, fmt.get("acodec"), part_path)
+                elif not extract_audio(None, target, fmt.get("acodec"), part_path, fmt["url"], headers,
+                                       should_stop=lambda: job.cancelled or job.paused):
+                    job.check()  # остановили — отменой или паузой
+                    raise JobCancelled(job.key)
+            except BaseException:
+                remove_files([part_path])
+                raise
+        os.replace(part_path, out_path)
+        self._remember(lib_key, out_path, job)
+        self._stage(job, "done")
+        self.log(f"Скачан звук ({target}): {data['title']}")
+
+    def _audio_chunks(self, fmt, headers, job):
+        # Байты потока по кускам; заодно прогресс, учёт байтов и проверка паузы/отмены.
+        # На паузе check() выводит задачу из воркера — соединение закрывается вместе с генератором,
+        # а после снятия паузы звук извлекается заново (ffmpeg с середины потока не продолжить)
+        # Пул для медиа, как у загрузки по диапазонам: превью и метаданные своих соединений не теряют
+        response = media_client().get(fmt["url"], headers=headers, stream=True)
+        try:
+            response.raise_for_status()
+            total = fmt.get("filesize") or fmt.get("filesize_approx") or int(response.headers.get("Content-Length") or 0)
+            done, started, reported = 0, time.time(), 0.0
+            for chunk in response.iter_content(STREAM_CHUNK):
+                job.check()
+                done += len(chunk)
+                yield chunk
+                now = time.time()
+                if now - reported >= AUDIO_REPORT_INTERVAL:
+                    reported = now
+                    speed = done / max(now - started, 1e-6)
+                    self.scheduler.report(
+                        job,
+                        percent=f"{done * 100 / total:.1f}%" if total else "",
+                        speed=f"{speed / 1024 / 1024:.2f}MiB/s",
+                        downloaded_bytes=done,
+                        total_bytes=total or None,
+                    )
+            self.metrics.add_bytes(job.key, done)
+        finally:
+            response.close()
@@ -0,0 +1,126 @@
+# 📦 История загрузок в SQLite: добавление за O(log n), поиск и постраничная выдача
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from meta_cache import cache_key
+
+HISTORY_DIR = os.path.join(os.path.dirname(__file__), "history")
+HISTORY_PATH = os.path.join(HISTORY_DIR, "history.json")  # старый формат, переносится один раз
+HISTORY_DB_PATH = os.path.join(HISTORY_DIR, "history.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    video_id  TEXT PRIMARY KEY,
+    url       TEXT NOT NULL,
+    thumb_url TEXT,
+    title     TEXT,
+    added_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_url ON history(url);
+CREATE INDEX IF NOT EXISTS history_added ON history(added_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class HistoryManager:
+    def __init__(self, path=HISTORY_DB_PATH, json_path=HISTORY_PATH, max_items=None):
+        # max_items=None — без ограничения; иначе старые записи вытесняются
+        self.path = path
+        self.max_items = max_items
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        self._migrate_json(json_path)
+
+    def _migrate_json(self, json_path):
+        # history.json переносится при первом запуске; сам файл не трогаем
+        with self._lock:
+            done = self._db.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done or not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+        now = time.time()
+        with self._lock, self._db:
+            # В json первой шла самая свежая запись
+            for offset, entry in enumerate(reversed(entries)):
+                if entry.get("url"):
+                    self._upsert(entry["url"], entry.get("thumb_url", ""), entry.get("title", ""), now - len(entries) + offset)
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+    def _upsert(self, url, thumb_url, title, added_at):
+        # Дубликаты по ID ролика: повторное добавление только поднимает запись наверх
+        self._db.execute(
+            "INSERT INTO history (video_id, url, thumb_url, title, added_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(video_id) DO UPDATE SET url = excluded.url, "
+            "thumb_url = COALESCE(NULLIF(excluded.thumb_url, ''), thumb_url), "
+            "title = COALESCE(NULLIF(excluded.title, ''), title), added_at = excluded.added_at",
+            (cache_key(url), url, thumb_url, title, added_at)
+        )
+
+    def add(self, url, thumb_url, title=""):
+        with self._lock, self._db:
+            self._upsert(url, thumb_url, title, time.time())
+            if self.max_items:
+                self._db.execute(
+                    "DELETE FROM history WHERE video_id IN "
+                    "(SELECT video_id FROM history ORDER BY added_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_items,)
+                )
+
+    def _where(self, query):
+        if not query:
+            return "", ()
+        like = f"%{query}%"
+        return " WHERE url LIKE ? OR title LIKE ? OR video_id = ?", (like, like, query)
+
+    def page(self, offset=0, limit=50, query=None):
+        # Свежие сверху; поиск по ссылке, названию или точному ID
+        where, params = self._where(query)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT video_id, url, thumb_url, title, added_at FROM history"
+                + where + " ORDER BY added_at DESC LIMIT ? OFFSET ?",
+                params + (limit, offset)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, query=None):
+        where, params = self._where(query)
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM history" + where, params).fetchone()[0]
+
+    def get(self, video_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM history WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_url(self, url):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM history WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, video_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM history WHERE video_id = ?", (video_id,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM history")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,128 @@
+# 📦 Окно истории: открывается сразу, миниатюры догружаются в фоне, записи — по страницам
+from tkinter import Toplevel, Frame, Label, Entry, Button, Canvas, Scrollbar, StringVar
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_THUMB_SIZE = (60, 45)
+
+
+class HistoryWindow:
+    def __init__(self, root, history_manager, thumb_cache, on_pick, schedule=None):
+        # on_pick(url) — вставить ссылку в главное окно;
+        # schedule(fn) — выполнить fn в Tk-потоке (по умолчанию root.after)
+        self.root = root
+        self.schedule = schedule or (lambda fn: root.after(0, fn))
+        self.history = history_manager
+        self.thumb_cache = thumb_cache
+        self.on_pick = on_pick
+        self.page = 0
+        self.total = 0
+        self.query = StringVar()
+        self.rows = {}  # video_id -> frame строки
+
+        self.win = Toplevel(root)
+        self.win.title("История загрузок")
+        self.win.configure(bg="#fff0f5")
+        self.win.geometry("520x600")
+
+        # Поиск
+        top = Frame(self.win, bg="#fff0f5")
+        top.pack(fill="x", padx=4, pady=4)
+        Label(top, text="Поиск:", bg="#fff0f5").pack(side="left")
+        search = Entry(top, textvariable=self.query, width=40)
+        search.pack(side="left", padx=4)
+        search.bind("<Return>", lambda e: self.show_page(0))
+        Button(top, text="🔍", command=lambda: self.show_page(0), bg="#ffe6f0").pack(side="left")
+
+        # Список с прокруткой
+        body = Frame(self.win, bg="#fff0f5")
+        body.pack(fill="both", expand=True)
+        self.canvas = Canvas(body, bg="#fff0f5", highlightthickness=0)
+        scroll = Scrollbar(body, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scroll.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+        self.list_frame = Frame(self.canvas, bg="#fff0f5")
+        self.canvas.create_window((0, 0), window=self.list_frame, anchor="nw")
+        self.list_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+
+        # Страницы
+        nav = Frame(self.win, bg="#fff0f5")
+        nav.pack(fill="x", pady=4)
+        Button(nav, text="◀", command=lambda: self.show_page(self.page - 1), bg="#ffe6f0").pack(side="left", padx=4)
+        self.page_label = Label(nav, bg="#fff0f5")
+        self.page_label.pack(side="left")
+        Button(nav, text="▶", command=lambda: self.show_page(self.page + 1), bg="#ffe6f0").pack(side="left", padx=4)
+        Button(nav, text="Очистить историю", command=self.clear, bg="#ffb3d9").pack(side="right", padx=4)
+
+        self.show_page(0)
+
+    def show_page(self, page):
+        query = self.query.get().strip() or None
+        self.total = self.history.count(query)
+        pages = max(1, (self.total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+        self.page = min(max(page, 0), pages - 1)
+        for frm in self.rows.values():
+            frm.destroy()
+        self.rows.clear()
+        for entry in self.history.page(self.page * HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE, query):
+            self._add_row(entry)
+        self.canvas.yview_moveto(0)
+        self._update_label()
+
+    def _update_label(self):
+        pages = max(1, (self.total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+        self.page_label.config(text=f"стр. {self.page + 1} из {pages} (записей: {self.total})")
+
+    def _add_row(self, entry):
+        frm = Frame(self.list_frame, bg="#fff0f5", bd=1, relief="solid", padx=2, pady=2)
+        frm.pack(fill="x", pady=2)
+        # Заглушка того же размера, миниатюра подставится, когда загрузится
+        thumb = Label(frm, text="…", bg="#ffe6f0", width=8, height=3)
+        thumb.pack(side="left")
+        if entry["thumb_url"]:
+            self.thumb_cache.get_photo_async(
+                entry["thumb_url"], HISTORY_THUMB_SIZE,
+                lambda photo, lbl=thumb: self._set_thumb(lbl, photo),
+                self.schedule,
+            )
+        else:
+            thumb.config(text="(нет превью)")
+        # Ссылка
+        url_entry = Entry(frm, width=40)
+        url_entry.insert(0, entry["url"])
+        url_entry.pack(side="left", padx=5)
+        # Кнопка вставить
+        Button(frm, text="⏎", command=lambda u=entry["url"]: self.on_pick(u), bg="#e0e0e0").pack(side="left", padx=2)
+        # Кнопка удалить
+        Button(frm, text="🗑", command=lambda v=entry["video_id"]: self.remove(v), bg="#ffe6f0").pack(side="left", padx=2)
+        self.rows[entry["video_id"]] = frm
+
+    def _set_thumb(self, lbl, photo):
+        # Окно могли закрыть или перелистнуть, пока миниатюра грузилась
+        if not lbl.winfo_exists():
+            return
+        if photo is None:
+            lbl.config(text="(нет превью)")
+            return
+        lbl.config(image=photo, text="", width=HISTORY_THUMB_SIZE[0], height=HISTORY_THUMB_SIZE[1])
+        lbl.image = photo
+
+    def remove(self, video_id):
+        # Удаляется только одна строка, остальное окно не перестраивается
+        self.history.remove(video_id)
+        frm = self.rows.pop(video_id, None)
+        if frm:
+            frm.destroy()
+        self.total -= 1
+        self._update_label()
+
+    def clear(self):
+        self.history.clear()
+        self.show_page(0)
+
+    def exists(self):
+        return self.win.winfo_exists()
+
+    def lift(self):
+        self.win.deiconify()
+        self.win.lift()
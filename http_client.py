@@ -0,0 +1,69 @@
+# 📦 Общий HTTP-клиент для превью и миниатюр: keep-alive, лимит соединений на хост,
+# единые таймауты и повтор с нарастающей паузой. Можно звать из любого потока.
+# requests импортируется при создании клиента, а не при импорте модуля
+import threading
+
+HTTP_TIMEOUT = (3.05, 10)  # (соединение, чтение), секунд
+HTTP_PER_HOST = 8          # соединений к одному хосту; лишние запросы ждут свободное
+HTTP_HOSTS = 16            # сколько хостов держать в пуле
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.3         # 0.3, 0.6, 1.2 с между попытками
+USER_AGENT = "Mozilla/5.0 (Sakura Downloader)"
+
+
+class HttpClient:
+    def __init__(self, per_host=HTTP_PER_HOST, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF):
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        # Один адаптер (и один пул соединений) на все потоки; pool_block — жёсткий лимит на хост
+        self._adapter = HTTPAdapter(pool_connections=HTTP_HOSTS, pool_maxsize=per_host,
+                                    pool_block=True, max_retries=retry)
+        self._local = threading.local()
+
+    def _session(self):
+        # Session не потокобезопасна (куки, заголовки), поэтому своя на поток,
+        # а соединения всё равно общие через адаптер
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        self._adapter.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_client():
+    # Один клиент на процесс
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HttpClient()
+        return _shared
@@ -0,0 +1,158 @@
+# 📦 Пакетное добавление: список ссылок, файл, плейлист или канал
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from meta_cache import cache_key, extract_video_id
+
+INGEST_WORKERS = 6
+
+_URL_RE = re.compile(r"https?://\S+")
+_COLLECTION_RE = re.compile(r"(?:[?&]list=|/playlist\b|/channel/|/c/|/user/|/@)")
+
+
+def parse_bulk_text(text):
+    # Ссылки через пробелы/переносы; строки с # — комментарии
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        urls.extend(_URL_RE.findall(line))
+    return urls
+
+
+def read_url_file(path):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_bulk_text(f.read())
+
+
+def is_collection_url(url):
+    # watch?v=...&list=... — это конкретный ролик, плейлист не раскрываем
+    if extract_video_id(url) and "/playlist" not in url:
+        return False
+    return bool(_COLLECTION_RE.search(url))
+
+
+def _flatten_entries(info):
+    # У канала вкладки (Видео, Shorts...) — это вложенные плейлисты
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        if entry.get("_type") in ("playlist", "multi_video") or entry.get("entries"):
+            yield from _flatten_entries(entry)
+        else:
+            url = entry.get("url") or entry.get("webpage_url")
+            if url and not url.startswith("http") and entry.get("ie_key") == "Youtube":
+                url = f"https://www.youtube.com/watch?v={url}"
+            if url:
+                yield url
+
+
+def expand_url(url):
+    # Плейлист/канал -> ссылки на ролики без полного извлечения каждого
+    if not is_collection_url(url):
+        return [url]
+    import yt_dlp
+    opts = {"quiet": True, "extract_flat": "in_playlist", "skip_download": True}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if info.get("_type") in ("playlist", "multi_video") or info.get("entries"):
+        return list(_flatten_entries(info))
+    return [url]
+
+
+class BulkIngestor:
+    # Пачки ссылок (start) встают в одну очередь; их разбирает один поток с одним пулом,
+    # сколько бы пачек ни пришло — в режиме демона это важно. close() — пачек больше не будет
+    def __init__(self, describe, on_result, on_error=None, on_done=None, workers=INGEST_WORKERS):
+        # describe(url) -> данные ролика; вызывается параллельно в пуле
+        self.describe = describe
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_done = on_done
+        self.workers = workers
+        self.total = 0
+        self.finished = 0
+        self.seen = set()  # ключи уже добавленных роликов, общие для всех пачек; менять под self._lock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._batches = queue.Queue()
+        self._thread = None
+        # Не раскрываем очередь дальше, чем успевает пул (backpressure)
+        self._slots = threading.BoundedSemaphore(workers * 2)
+
+    def start(self, urls, known_keys=()):
+        with self._lock:
+            self.seen.update(known_keys)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._batches.put(list(urls))
+        return self._thread
+
+    def close(self):
+        # Поток доразберёт то, что уже в очереди, дождётся пула и завершится (после — on_done)
+        self._batches.put(None)
+
+    def join(self):
+        if self._thread:
+            self._thread.join()
+
+    def stop(self):
+        self._stop.set()
+        self._batches.put(None)
+
+    def _claim(self, url):
+        # Проверка и отметка за один шаг: один ролик не разбирается дважды
+        key = cache_key(url)
+        with self._lock:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            self.total += 1
+            return True
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop.is_set():
+                urls = self._batches.get()
+                if urls is None:
+                    break
+                for source in urls:
+                    if self._stop.is_set():
+                        break
+                    try:
+                        expanded = expand_url(source)
+                    except Exception as e:
+                        self._error(source, e)
+                        continue
+                    for url in expanded:
+                        if not self._claim(url):
+                            continue  # дубликат по ID ролика
+                        self._slots.acquire()
+                        if self._stop.is_set():
+                            self._slots.release()
+                            with self._lock:
+                                self.total -= 1
+                            break
+                        pool.submit(self._describe, url)
+        if self.on_done:
+            self.on_done(self)
+
+    def _describe(self, url):
+        try:
+            data = self.describe(url)
+        except Exception as e:
+            self._error(url, e)
+        else:
+            self.on_result(data)
+        finally:
+            with self._lock:
+                self.finished += 1
+            self._slots.release()
+
+    def _error(self, url, error):
+        if self.on_error:
+            self.on_error(url, error)
@@ -0,0 +1,109 @@
+# 📦 Журнал задач загрузки (SQLite): переживает закрытие и падение программы
+import os
+import time
+import sqlite3
+import threading
+
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), "history", "jobs.sqlite3")
+# Этапы задачи по порядку
+STAGES = ("metadata", "video", "audio", "merge", "done")
+DONE_KEEP_SECONDS = 30 * 24 * 3600
+# После стольких неудач подряд задача при запуске больше не возобновляется
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key          TEXT PRIMARY KEY,
+    url          TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    out_dir      TEXT NOT NULL,
+    title        TEXT,
+    format_label TEXT,
+    dub          TEXT,
+    subtitle     TEXT,
+    stage        TEXT NOT NULL,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_stage ON jobs(stage);
+"""
+
+
+class JobJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            try:
+                # Журнал из старой версии — без счётчика попыток
+                self._db.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            # Завершённые задачи храним месяц
+            self._db.execute(
+                "DELETE FROM jobs WHERE stage = 'done' AND updated_at < ?",
+                (time.time() - DONE_KEEP_SECONDS,)
+            )
+
+    def record(self, key, url, kind, out_dir, title="", format_label="", dub="", subtitle=""):
+        # Счётчик неудач незавершённой задачи переживает повторную постановку в очередь
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(key, url, kind, out_dir, title, format_label, dub, subtitle, stage, error, attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'metadata', NULL, "
+                "COALESCE((SELECT attempts FROM jobs WHERE key = ? AND stage != 'done'), 0), ?, ?)",
+                (key, url, kind, out_dir, title, format_label, dub, subtitle, key, now, now)
+            )
+
+    def set_stage(self, key, stage, error=None):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, error = ?, updated_at = ? WHERE key = ?",
+                (stage, str(error) if error else None, time.time(), key)
+            )
+
+    def set_error(self, key, error):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET error = ?, attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                (str(error), time.time(), key)
+            )
+
+    def remove(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs WHERE key = ?", (key,))
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self, max_attempts=MAX_ATTEMPTS):
+        # Задачи, которые падали max_attempts раз, не возобновляются (см. given_up)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE stage != 'done' AND attempts < ? ORDER BY created_at",
+                (max_attempts,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def given_up(self, max_attempts=MAX_ATTEMPTS):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE stage != 'done' AND attempts >= ? ORDER BY created_at",
+                (max_attempts,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,224 @@
+# 📦 Библиотека готовых файлов (SQLite): что уже скачано, по ключу (ID ролика, ID формата, дубляж).
+# Пакетные задачи сначала смотрят сюда: файл в той же папке — пропуск, в другой — жёсткая ссылка.
+# В каждой папке рядом с файлами лежит манифест (.sakura_library.json) — по нему rescan()
+# восстанавливает индекс, даже если база потерялась или папку перенесли
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+import threading
+
+LIBRARY_PATH = os.path.join(os.path.dirname(__file__), "history", "library.sqlite3")
+LIBRARY_MANIFEST = ".sakura_library.json"
+HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    path       TEXT PRIMARY KEY,
+    video_id   TEXT NOT NULL,
+    format_id  TEXT NOT NULL,
+    dub        TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    mtime      REAL NOT NULL,
+    checksum   TEXT NOT NULL,
+    added_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_key ON outputs(video_id, format_id, dub);
+"""
+
+
+def file_checksum(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def place_copy(src, dst):
+    # Жёсткая ссылка — мгновенно и без лишнего места; между дисками — обычная копия
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class LibraryIndex:
+    def __init__(self, path=LIBRARY_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    # --- поиск ---
+
+    def lookup(self, video_id, format_id, dub="", prefer_dir=None):
+        # Живой файл с таким ключом (из prefer_dir — первым) или None.
+        # Файлы, которые удалили или изменили, заодно выбрасываются из индекса
+        with self._lock:
+            rows = [dict(r) for r in self._db.execute(
+                "SELECT * FROM outputs WHERE video_id = ? AND format_id = ? AND dub = ?",
+                (video_id, format_id, dub or "")
+            ).fetchall()]
+        if prefer_dir:
+            prefer_dir = os.path.normcase(os.path.abspath(prefer_dir))
+            rows.sort(key=lambda r: os.path.normcase(os.path.dirname(r["path"])) != prefer_dir)
+        for row in rows:
+            if self._alive(row):
+                return row
+            self._forget(row["path"])
+        return None
+
+    def _alive(self, row):
+        # Размер и время изменения те же — файл считаем прежним. Время другое (копировали,
+        # трогали, перезаписали тем же размером) — сверяем содержимое и запоминаем новое время
+        try:
+            st = os.stat(row["path"])
+            if st.st_size != row["size"]:
+                return False
+            if st.st_mtime == row["mtime"]:
+                return True
+            if file_checksum(row["path"]) != row["checksum"]:
+                return False
+        except OSError:
+            return False
+        self._store(dict(row, mtime=st.st_mtime))
+        return True
+
+    def reuse(self, row, out_dir):
+        # Файл из библиотеки — в out_dir под тем же именем. True — понадобилась ссылка или копия
+        dst = os.path.join(out_dir, os.path.basename(row["path"]))
+        if os.path.exists(dst):
+            if os.path.samefile(dst, row["path"]):
+                return dst, False
+            if os.path.getsize(dst) == row["size"] and file_checksum(dst) == row["checksum"]:
+                self._store(dict(row, path=dst, mtime=os.path.getmtime(dst)))
+                return dst, False
+            os.remove(dst)  # под нужным именем лежит что-то другое — заменяем
+        place_copy(row["path"], dst)
+        self._store(dict(row, path=dst, mtime=os.path.getmtime(dst)))
+        return dst, True
+
+    # --- запись ---
+
+    def add(self, video_id, format_id, dub, path):
+        # Вызывается после успешной загрузки; контрольная сумма считается здесь, в рабочем потоке
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        self._store({
+            "path": path,
+            "video_id": video_id,
+            "format_id": format_id,
+            "dub": dub or "",
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "checksum": file_checksum(path),
+        })
+
+    def _store(self, row):
+        row = dict(row, path=os.path.abspath(row["path"]), added_at=row.get("added_at") or time.time())
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO outputs (path, video_id, format_id, dub, size, mtime, checksum, added_at) "
+                    "VALUES (:path, :video_id, :format_id, :dub, :size, :mtime, :checksum, :added_at)", row
+                )
+            self._update_manifest(os.path.dirname(row["path"]), {os.path.basename(row["path"]): row})
+
+    def _forget(self, path):
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM outputs WHERE path = ?", (path,))
+            self._update_manifest(os.path.dirname(path), {os.path.basename(path): None})
+
+    # --- манифесты папок ---
+
+    def _read_manifest(self, folder):
+        try:
+            with open(os.path.join(folder, LIBRARY_MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update_manifest(self, folder, changes):
+        # changes: имя файла -> запись или None (удалить); вызывать под self._lock
+        manifest = self._read_manifest(folder)
+        for name, row in changes.items():
+            if row is None:
+                manifest.pop(name, None)
+            else:
+                manifest[name] = {k: row[k] for k in ("video_id", "format_id", "dub", "size", "mtime", "checksum")}
+        path = os.path.join(folder, LIBRARY_MANIFEST)
+        try:
+            if not manifest:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # папка только для чтения: индекс в базе всё равно есть
+
+    def rescan(self, folders, log=print):
+        # Пересобирает индекс для папок по их манифестам: пропавшие файлы удаляются,
+        # изменённые перепроверяются по контрольной сумме. Возвращает число живых записей.
+        # Файлы без манифеста не подхватываются: по имени не понять формат и дубляж
+        kept = 0
+        for top in folders:
+            top = os.path.abspath(top)
+            before = kept
+            # Точное сравнение префикса: в LIKE «_» и «%» из имени папки были бы шаблонами
+            prefix = os.path.join(top, "")
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM outputs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            for folder, _, files in os.walk(top):
+                if LIBRARY_MANIFEST not in files:
+                    continue
+                manifest = self._read_manifest(folder)
+                changes = {}
+                for name, entry in manifest.items():
+                    path = os.path.join(folder, name)
+                    if not isinstance(entry, dict) or not all(k in entry for k in ("video_id", "format_id", "size", "checksum")):
+                        changes[name] = None
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        changes[name] = None
+                        continue
+                    row = dict(entry, path=path, dub=entry.get("dub") or "", mtime=entry.get("mtime") or st.st_mtime)
+                    if st.st_size != entry.get("size"):
+                        changes[name] = None
+                        continue
+                    if st.st_mtime != entry.get("mtime"):
+                        # Скопировали или трогали — содержимое сверяем
+                        if file_checksum(path) != entry.get("checksum"):
+                            changes[name] = None
+                            continue
+                        row["mtime"] = st.st_mtime
+                        changes[name] = row
+                    row["added_at"] = time.time()
+                    with self._lock, self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO outputs (path, video_id, format_id, dub, size, mtime, checksum, added_at) "
+                            "VALUES (:path, :video_id, :format_id, :dub, :size, :mtime, :checksum, :added_at)", row
+                        )
+                    kept += 1
+                if changes:
+                    with self._lock:
+                        self._update_manifest(folder, changes)
+            log(f"Библиотека: {top} — файлов в индексе {kept - before}")
+        return kept
+
+    def close(self):
+        with self._lock:
+            self._db.close()
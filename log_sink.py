@@ -0,0 +1,73 @@
+# 📦 Лог с ограниченным буфером: строки копятся из любых потоков,
+# а окно забирает их пачкой по таймеру. Прогресс по ролику не пишется
+# строками — хранится только последнее состояние на каждый ролик
+import os
+import logging
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE_PATH = os.path.join(os.path.dirname(__file__), "logs", "sakura.log")
+MAX_LOG_LINES = 1000
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class LogSink:
+    def __init__(self, max_lines=MAX_LOG_LINES):
+        self.max_lines = max_lines
+        self._pending = deque(maxlen=max_lines)  # старые непоказанные строки просто вытесняются
+        self._dropped = 0
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._file_logger = None
+
+    # --- запись (из любого потока) ---
+
+    def write(self, msg):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(msg)
+        if self._file_logger:
+            self._file_logger.info(msg)
+
+    def trace(self, msg):
+        # Подробные строки (каждый шаг прогресса) — только в файл, если он включён
+        if self._file_logger:
+            self._file_logger.info(msg)
+
+    def progress(self, key, text):
+        # Последнее состояние перезаписывает предыдущее: UI увидит только его
+        with self._lock:
+            self._progress[key] = text
+
+    # --- чтение (из Tk-потока по таймеру) ---
+
+    def drain(self):
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+            progress, self._progress = self._progress, {}
+        return lines, dropped, progress
+
+    # --- файл ---
+
+    def set_file(self, path=LOG_FILE_PATH):
+        # path=None выключает запись в файл
+        if self._file_logger:
+            for handler in list(self._file_logger.handlers):
+                self._file_logger.removeHandler(handler)
+                handler.close()
+            self._file_logger = None
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger = logging.getLogger(f"sakura.log.{id(self)}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        self._file_logger = logger
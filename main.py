@@ -1,9 +1,12 @@
-from tkinter import Tk, Button
-from ui_sakura import build_ui  # Импорт основного интерфейса
-from browser_panel import show_browser  # Импорт функции для браузера
 import os
+import sys
+
+
+def run_gui():
+    # tkinter, PIL и pywebview нужны только окну — в консольном режиме не грузим
+    from tkinter import Tk, Button
+    from ui_sakura import build_ui  # Импорт основного интерфейса
 
-def main():
     # Создаём главное окно приложения
     root = Tk()
     root.title("Sakura Downloader 🌸")
@@ -24,7 +27,7 @@ def main():
     Button(
         root,
         text="Браузер",
-        command=show_browser,
+        command=open_browser,
         bg="#ffe6f0",
         fg="#800040",
         activebackground="#ffb3d9",
@@ -37,5 +40,17 @@ def main():
     # Запускаем главный цикл приложения
     root.mainloop()
 
+def open_browser():
+    # pywebview и tkinterweb грузятся только по нажатию кнопки
+    from browser_panel import show_browser
+    show_browser()
+
+def main():
+    # С аргументами — консольный режим без окна (см. cli.py)
+    if len(sys.argv) > 1:
+        from cli import run_cli
+        sys.exit(run_cli(sys.argv[1:]))
+    run_gui()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+# 📦 Работа с ffmpeg: сведение дорожек без лишнего перекодирования
+import json
+import subprocess
+
+# Кодеки, которые mp4 принимает как есть (по префиксу из yt-dlp или имени из ffprobe)
+MP4_VIDEO_COPY = ("avc1", "avc3", "h264", "hev1", "hvc1", "hevc", "h265", "vp09", "vp9", "av01", "av1", "mp4v")
+MP4_AUDIO_COPY = ("mp4a", "aac", "opus", "mp3", "ac-3", "ac3", "ec-3", "eac3", "flac", "alac")
+
+
+def probe_codec(path, kind):
+    # kind: "v" или "a"; имя кодека первой подходящей дорожки или None
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", f"{kind}:0",
+        "-show_entries", "stream=codec_name", "-of", "json", path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    try:
+        streams = json.loads(result.stdout).get("streams") or []
+    except ValueError:
+        return None
+    return streams[0].get("codec_name") if streams else None
+
+
+def _fits(codec, allowed):
+    codec = (codec or "").lower()
+    return bool(codec) and codec != "none" and codec.startswith(allowed)
+
+
+def video_codec_args(vcodec):
+    return ["-c:v", "copy"] if _fits(vcodec, MP4_VIDEO_COPY) else ["-c:v", "libx264", "-preset", "veryfast"]
+
+
+def audio_codec_args(acodec, index):
+    if _fits(acodec, MP4_AUDIO_COPY):
+        return [f"-c:a:{index}", "copy"]
+    return [f"-c:a:{index}", "aac", f"-b:a:{index}", "192k"]
+
+
+def iso_lang(lang):
+    # "en-US" -> "en"; ffmpeg сам переводит двухбуквенный код в ISO 639-2 для mp4
+    return (lang or "").split("-")[0].split("_")[0].lower()
+
+
+def mux_cmd(video_path, audio_tracks, out_path, vcodec=None):
+    # Видео + любое число звуковых дорожек -> mp4 одним вызовом ffmpeg.
+    # audio_tracks: [{"path", "acodec", "lang", "title"}]; первая дорожка — по умолчанию
+    if not vcodec:
+        vcodec = probe_codec(video_path, "v")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", video_path]
+    for track in audio_tracks:
+        cmd += ["-i", track["path"]]
+    cmd += ["-map", "0:v:0"]
+    for i in range(len(audio_tracks)):
+        cmd += ["-map", f"{i + 1}:a:0"]
+    cmd += video_codec_args(vcodec)
+    for i, track in enumerate(audio_tracks):
+        acodec = track.get("acodec") or probe_codec(track["path"], "a")
+        cmd += audio_codec_args(acodec, i)
+        lang = iso_lang(track.get("lang"))
+        if lang:
+            cmd += [f"-metadata:s:a:{i}", f"language={lang}"]
+        if track.get("title"):
+            cmd += [f"-metadata:s:a:{i}", f"title={track['title']}"]
+        cmd += [f"-disposition:a:{i}", "default" if i == 0 else "0"]
+    cmd += ["-movflags", "+faststart", out_path]
+    return cmd
+
+
+def mux(video_path, audio_tracks, out_path, vcodec=None, should_stop=None):
+    # should_stop() — опрашивается раз в полсекунды; True останавливает ffmpeg
+    cmd = mux_cmd(video_path, audio_tracks, out_path, vcodec)
+    proc = subprocess.Popen(cmd)
+    while True:
+        try:
+            code = proc.wait(timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            if should_stop and should_stop():
+                proc.kill()
+                proc.wait()
+                return False
+    if code:
+        raise subprocess.CalledProcessError(code, cmd)
+    return True
+
+
+# Только звук: целевой формат -> (кодек источника, который можно не перекодировать, аргументы кодирования, muxer)
+AUDIO_FORMATS = {
+    "mp3": ("mp3", ["-c:a", "libmp3lame", "-q:a", "2"], "mp3"),
+    "opus": ("opus", ["-c:a", "libopus", "-b:a", "160k"], "opus"),
+}
+STREAM_CHUNK = 256 * 1024
+
+
+def audio_cmd(target, acodec, out_path, src="pipe:0", headers=None):
+    # src — "pipe:0" (поток идёт через stdin) или ссылка, которую ffmpeg читает сам
+    copy_codec, encode_args, muxer = AUDIO_FORMATS[target]
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    if headers and src != "pipe:0":
+        cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    cmd += ["-i", src, "-map", "0:a:0", "-vn"]
+    cmd += ["-c:a", "copy"] if _fits(acodec, (copy_codec,)) else encode_args
+    cmd += ["-f", muxer, out_path]
+    return cmd
+
+
+def extract_audio(chunks, target, acodec, out_path, src_url=None, headers=None, should_stop=None):
+    # Звуковая дорожка -> out_path без промежуточных файлов.
+    # chunks — итератор байтов, они пишутся в stdin ffmpeg по мере скачивания;
+    # если chunks=None, ffmpeg сам читает src_url (HLS/DASH по фрагментам).
+    # Исключение из chunks (например, отмена задачи) останавливает ffmpeg и пробрасывается дальше
+    if chunks is None:
+        cmd = audio_cmd(target, acodec, out_path, src_url, headers)
+        proc = subprocess.Popen(cmd)
+        while True:
+            try:
+                code = proc.wait(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if should_stop and should_stop():
+                    proc.kill()
+                    proc.wait()
+                    return False
+    else:
+        cmd = audio_cmd(target, acodec, out_path)
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg завершился сам — код возврата скажет, почему
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        code = proc.wait()
+    if code:
+        raise subprocess.CalledProcessError(code, cmd)
+    return True
@@ -0,0 +1,107 @@
+# 📦 Постоянный кэш метаданных extract_info, ключ — ID ролика
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+META_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "meta")
+META_TTL = 7 * 24 * 3600  # название, субтитры, список форматов меняются редко
+MAX_META_ENTRIES = 2000
+
+# Поля, которые реально использует интерфейс. Ссылок на потоки в кэше нет:
+# они подписаны и живут несколько часов, поэтому загрузка всегда берёт свежие (см. engine)
+INFO_KEYS = ("id", "title", "webpage_url", "extractor_key", "duration", "thumbnail", "thumbnails")
+FORMAT_KEYS = (
+    "format_id", "format_note", "ext", "acodec", "vcodec", "height", "width",
+    "fps", "abr", "tbr", "filesize", "filesize_approx", "language", "protocol",
+)
+
+
+def extract_video_id(url):
+    m = re.search(r"(?:v=|be/|shorts/|embed/)([A-Za-z0-9_-]{11})", url)
+    return m.group(1) if m else None
+
+
+def cache_key(url):
+    # Для YouTube — ID ролика, для остальных сайтов — хэш ссылки
+    video_id = extract_video_id(url)
+    if video_id:
+        return video_id
+    return "url-" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def trim_info(info):
+    # Оставляем только нужное: полный info_dict весит сотни килобайт
+    data = {k: info.get(k) for k in INFO_KEYS}
+    data["formats"] = [{k: f.get(k) for k in FORMAT_KEYS if f.get(k) is not None} for f in info.get("formats") or []]
+    data["subtitles"] = {
+        lang: [{"ext": t.get("ext"), "name": t.get("name")} for t in tracks]
+        for lang, tracks in (info.get("subtitles") or {}).items()
+    }
+    return data
+
+
+class MetadataCache:
+    def __init__(self, cache_dir=META_CACHE_DIR, ttl=META_TTL, max_entries=MAX_META_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, url):
+        path = self._path(cache_key(url))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("fetched_at", 0) > self.ttl:
+            return None
+        os.utime(path)  # для вытеснения по давности использования
+        return entry["info"]
+
+    def put(self, url, info):
+        data = trim_info(info)
+        entry = {"fetched_at": time.time(), "info": data}
+        self._write(cache_key(url), entry)
+        return data
+
+    def extract(self, url, ydl_opts=None):
+        # Кэш -> сеть; повторное добавление известного ролика не трогает сеть
+        info = self.get(url)
+        if info is not None:
+            return info
+        import yt_dlp  # тяжёлый импорт — только при первом извлечении
+        with yt_dlp.YoutubeDL(dict(ydl_opts or {}, quiet=True)) as ydl:
+            info = ydl.extract_info(url, download=False)
+        return self.put(url, info)
+
+    def _write(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            self._evict()
+
+    def _evict(self):
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".json")]
+        except OSError:
+            return
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.cache_dir, n) for n in names]
+        paths.sort(key=lambda p: os.path.getmtime(p))
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
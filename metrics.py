@@ -0,0 +1,255 @@
+# 📦 Замеры конвейера: интервалы по этапам каждой задачи, байты и скорость,
+# глубина очереди и задержка цикла Tk. Экспорт — JSON Lines (трасса) и текст в формате Prometheus.
+# Всё потокобезопасно: пишут рабочие потоки, читает окно статистики или консольный режим
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque, Counter
+
+MAX_SPANS = 10000   # в памяти держим только последние интервалы
+MAX_JOBS = 2000     # и сводки по последним задачам
+LAG_WINDOW = 300    # замеров задержки Tk для среднего и максимума
+PROFILE_INTERVAL = 0.005
+PROFILE_DEPTH = 40
+# Вершины стека простаивающих потоков — в «горячие» места не попадают
+IDLE_FRAMES = ("threading.py:wait", "threading.py:_wait_for_tstate_lock", "queue.py:get", "selectors.py:select")
+
+
+class Metrics:
+    def __init__(self, trace_path=None):
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=MAX_SPANS)
+        self.jobs = {}  # key -> {"title", "stages": {этап: секунды}, "bytes", "started", "finished"}
+        self.stage_totals = Counter()  # этап -> суммарные секунды
+        self.stage_counts = Counter()
+        self.stage_errors = Counter()
+        self.bytes_total = 0
+        self.lag = deque(maxlen=LAG_WINDOW)
+        self.gauges = {}  # имя -> функция, значение берётся в момент чтения
+        self._trace = None
+        if trace_path:
+            self.set_trace(trace_path)
+
+    # --- запись (из любых потоков) ---
+
+    def span(self, key, stage, **fields):
+        return _Span(self, key, stage, fields)
+
+    def record(self, key, stage, start, end, ok=True, **fields):
+        duration = max(0.0, end - start)
+        span = dict(fields, key=key, stage=stage, start=round(start, 6), duration=round(duration, 6), ok=ok)
+        with self._lock:
+            self.spans.append(span)
+            job = self._job(key)
+            job["stages"][stage] = job["stages"].get(stage, 0.0) + duration
+            job["started"] = min(job["started"] or start, start)
+            job["finished"] = max(job["finished"] or end, end)
+            self.stage_totals[stage] += duration
+            self.stage_counts[stage] += 1
+            if not ok:
+                self.stage_errors[stage] += 1
+            trace = self._trace
+            if trace:
+                trace.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+                trace.flush()
+
+    def add_bytes(self, key, count):
+        if not count:
+            return
+        with self._lock:
+            self._job(key)["bytes"] += count
+            self.bytes_total += count
+
+    def set_title(self, key, title):
+        with self._lock:
+            self._job(key)["title"] = title
+
+    def observe_lag(self, seconds):
+        with self._lock:
+            self.lag.append(max(0.0, seconds))
+
+    def gauge(self, name, func):
+        # func() -> число или {метка: число}; вызывается при чтении
+        self.gauges[name] = func
+
+    def _job(self, key):
+        job = self.jobs.get(key)
+        if job is None:
+            if len(self.jobs) >= MAX_JOBS:
+                self.jobs.pop(next(iter(self.jobs)))
+            job = self.jobs[key] = {"title": "", "stages": {}, "bytes": 0, "started": None, "finished": None}
+        return job
+
+    # --- чтение ---
+
+    def job_rows(self):
+        # Сводка по задачам для окна статистики: свежие сверху
+        with self._lock:
+            items = [(key, dict(job, stages=dict(job["stages"]))) for key, job in self.jobs.items()]
+        rows = []
+        for key, job in reversed(items):
+            transfer = job["stages"].get("download", 0.0)
+            rows.append({
+                "key": key,
+                "title": job["title"] or key,
+                "stages": job["stages"],
+                "bytes": job["bytes"],
+                "throughput": job["bytes"] / transfer if transfer else None,
+                "total": (job["finished"] - job["started"]) if job["started"] else 0.0,
+            })
+        return rows
+
+    def lag_stats(self):
+        with self._lock:
+            lag = list(self.lag)
+        if not lag:
+            return {"last": 0.0, "avg": 0.0, "max": 0.0}
+        return {"last": lag[-1], "avg": sum(lag) / len(lag), "max": max(lag)}
+
+    def gauge_values(self):
+        values = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                values[name] = func()
+            except Exception:
+                pass
+        return values
+
+    def prometheus_text(self):
+        with self._lock:
+            totals = dict(self.stage_totals)
+            counts = dict(self.stage_counts)
+            errors = dict(self.stage_errors)
+            bytes_total = self.bytes_total
+        lines = [
+            "# HELP sakura_stage_seconds Время этапов задач",
+            "# TYPE sakura_stage_seconds summary",
+        ]
+        for stage in sorted(totals):
+            lines.append(f'sakura_stage_seconds_sum{{stage="{stage}"}} {totals[stage]:.6f}')
+            lines.append(f'sakura_stage_seconds_count{{stage="{stage}"}} {counts[stage]}')
+        lines += ["# HELP sakura_stage_errors_total Этапы, закончившиеся ошибкой", "# TYPE sakura_stage_errors_total counter"]
+        for stage in sorted(errors):
+            lines.append(f'sakura_stage_errors_total{{stage="{stage}"}} {errors[stage]}')
+        lines += [
+            "# HELP sakura_downloaded_bytes_total Скачано байт",
+            "# TYPE sakura_downloaded_bytes_total counter",
+            f"sakura_downloaded_bytes_total {bytes_total}",
+        ]
+        lag = self.lag_stats()
+        lines += [
+            "# HELP sakura_tk_loop_lag_seconds Задержка цикла событий Tk",
+            "# TYPE sakura_tk_loop_lag_seconds gauge",
+            f'sakura_tk_loop_lag_seconds{{stat="last"}} {lag["last"]:.6f}',
+            f'sakura_tk_loop_lag_seconds{{stat="avg"}} {lag["avg"]:.6f}',
+            f'sakura_tk_loop_lag_seconds{{stat="max"}} {lag["max"]:.6f}',
+        ]
+        for name, value in sorted(self.gauge_values().items()):
+            lines += [f"# TYPE sakura_{name} gauge"]
+            if isinstance(value, dict):
+                for label, v in sorted(value.items()):
+                    lines.append(f'sakura_{name}{{state="{label}"}} {v}')
+            else:
+                lines.append(f"sakura_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # --- экспорт ---
+
+    def set_trace(self, path):
+        # Каждый закрытый интервал сразу дописывается строкой JSON; path=None — выключить
+        with self._lock:
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._trace = open(path, "a", encoding="utf-8")
+
+    def export_trace(self, path):
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    def write_prometheus(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+
+class _Span:
+    def __init__(self, metrics, key, stage, fields):
+        self.metrics = metrics
+        self.key = key
+        self.stage = stage
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.key, self.stage, self.start, time.time(), ok=exc_type is None, **self.fields)
+        return False
+
+
+class SamplingProfiler:
+    # Необязательный профилировщик: раз в PROFILE_INTERVAL снимает стеки всех потоков.
+    # Не замедляет рабочие потоки (в отличие от cProfile) и видит их все сразу.
+    # Результат — «свёрнутые стеки» (формат flamegraph.pl / speedscope)
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def hot(self, limit=20):
+        # Функции, которые чаще всего оказывались на вершине стека
+        tops = Counter()
+        for stack, count in self.stacks.items():
+            top = stack.rsplit(";", 1)[-1]
+            if top not in IDLE_FRAMES:
+                tops[top] += count
+        return tops.most_common(limit)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,138 @@
+# 📦 Компактная таблица форматов ролика: только нужные поля и готовые индексы.
+# Строится один раз при разборе ссылки; сырой список форматов yt-dlp в элементе не хранится
+
+# Пункт меню дубляжа: оригинал и все дубляжи отдельными дорожками
+DUB_ALL_LABEL = "Все дорожки"
+
+LANG_NATIVE = {
+    "ru": "Русский",
+    "en": "English",
+    "es": "Español",
+    "fr": "Français",
+    "de": "Deutsch",
+    "ja": "日本語",
+    "ko": "한국어",
+    "hi": "हिन्दी",
+    "pt": "Português",
+    "it": "Italiano",
+    "tr": "Türkçe",
+    "vi": "Tiếng Việt",
+    "zh": "中文",
+    "ar": "العربية",
+    #остальные языки по необходимости...
+}
+
+
+def is_dub_note(note):
+    note = (note or "").lower()
+    return "dubbed" in note or "дубляж" in note
+
+
+class Format:
+    __slots__ = ("format_id", "ext", "note", "vcodec", "acodec", "height", "fps", "abr", "language", "dubbed")
+
+    def __init__(self, f):
+        self.format_id = f["format_id"]
+        self.ext = f.get("ext") or ""
+        self.note = f.get("format_note") or ""
+        self.vcodec = f.get("vcodec")
+        self.acodec = f.get("acodec")
+        self.height = f.get("height") or 0
+        self.fps = f.get("fps")
+        self.abr = f.get("abr") or 0
+        self.language = f.get("language") or ""
+        self.dubbed = is_dub_note(self.note)
+
+    @property
+    def has_video(self):
+        return bool(self.vcodec) and self.vcodec != "none"
+
+    @property
+    def has_audio(self):
+        return bool(self.acodec) and self.acodec != "none"
+
+    def label(self):
+        label = self.ext
+        if self.note:
+            label += f" {self.note}"
+        if self.height:
+            label += f" {self.height}p"
+        if self.fps:
+            label += f" {self.fps}fps"
+        if self.has_video:
+            label += f" {self.vcodec}"
+        if self.has_audio:
+            label += " audio"
+        return label
+
+    def dub_label(self):
+        return f"{LANG_NATIVE.get(self.language, self.language)} (dubbed)"
+
+
+class FormatTable:
+    # choices — подписи для меню (без повторов), by_label — подпись -> Format;
+    # best_video / best_audio — готовый выбор для режима «лучшее»;
+    # dubs — подпись дубляжа -> Format, dubs_by_lang — язык -> лучшая дорожка
+    __slots__ = ("choices", "by_label", "best_video", "best_audio", "dubs", "dubs_by_lang")
+
+    def __init__(self, formats):
+        self.choices = []
+        self.by_label = {}
+        self.best_video = None
+        self.best_audio = None
+        self.dubs = {}
+        self.dubs_by_lang = {}
+        for raw in formats or []:
+            if not raw.get("format_id"):
+                continue
+            f = Format(raw)
+            label = f.label()
+            if label in self.by_label:
+                label += f" [{f.format_id}]"  # одинаковые подписи различаем по ID формата
+            self.choices.append(label)
+            self.by_label[label] = f
+
+            if f.dubbed:
+                if f.has_audio and not f.has_video:
+                    best = self.dubs_by_lang.get(f.language)
+                    if best is None or f.abr > best.abr:
+                        self.dubs_by_lang[f.language] = f
+                continue
+            # Лучшее видео без звука по высоте и лучший оригинальный звук по битрейту
+            if f.has_video and not f.has_audio:
+                if self.best_video is None or f.height > self.best_video.height:
+                    self.best_video = f
+            elif f.has_audio and not f.has_video:
+                if self.best_audio is None or f.abr > self.best_audio.abr:
+                    self.best_audio = f
+        for f in self.dubs_by_lang.values():
+            self.dubs[f.dub_label()] = f
+
+    @property
+    def dub_choices(self):
+        return list(self.dubs)
+
+    def format_id(self, label):
+        # Подпись из меню -> ID формата; иначе это уже селектор yt-dlp
+        f = self.by_label.get(label)
+        return f.format_id if f else label
+
+    def find(self, label):
+        # Подпись из меню или ID формата -> Format; None для селекторов вроде "bv*+ba/b"
+        f = self.by_label.get(label)
+        if f is None:
+            f = next((f for f in self.by_label.values() if f.format_id == label), None)
+        return f
+
+    def select_dubs(self, selected):
+        # selected: подпись из меню, код языка или DUB_ALL_LABEL/"all" -> [(подпись, Format)]
+        if not self.dubs:
+            return []
+        if selected in (DUB_ALL_LABEL, "all"):
+            return list(self.dubs.items())
+        if selected in self.dubs:
+            return [(selected, self.dubs[selected])]
+        if selected in self.dubs_by_lang:
+            f = self.dubs_by_lang[selected]
+            return [(f.dub_label(), f)]
+        return [next(iter(self.dubs.items()))]  # fallback
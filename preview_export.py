@@ -0,0 +1,119 @@
+# 📦 Пакетное сохранение превью: в фоне, несколько загрузок сразу, запись на диск кусками.
+# Уже сохранённые файлы не скачиваются заново — сервер подтверждает их по ETag/Last-Modified
+import os
+import json
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import shared_client
+
+EXPORT_WORKERS = 8
+CHUNK_SIZE = 64 * 1024
+VALIDATORS_FILE = ".sakura_previews.json"  # ETag сохранённых превью, по одному файлу на папку
+
+SAVED = "saved"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+def preview_ext(url):
+    # Расширение по ссылке: превью бывают и jpg, и webp
+    name = url.split("?")[0].rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return ext if ext in ("jpg", "jpeg", "png", "webp") else "jpg"
+
+
+class PreviewExporter:
+    def __init__(self, http=None, workers=EXPORT_WORKERS, on_result=None, on_done=None):
+        # on_result(url, path, status, error) и on_done(counts) вызываются из фоновых потоков
+        self.http = http or shared_client()
+        self.workers = workers
+        self.on_result = on_result
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._validators = {}  # папка -> {имя файла: etag}
+
+    def start(self, tasks):
+        # tasks: [(url, путь к файлу)]
+        thread = threading.Thread(target=self.run, args=(list(tasks),), daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, tasks):
+        counts = {SAVED: 0, UNCHANGED: 0, FAILED: 0}
+        if tasks:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                for status in pool.map(lambda task: self._export(*task), tasks):
+                    counts[status] += 1
+        for folder in list(self._validators):
+            self._save_validators(folder)
+        if self.on_done:
+            self.on_done(counts)
+        return counts
+
+    def _export(self, url, path):
+        try:
+            status = self.export_one(url, path)
+            error = None
+        except Exception as e:
+            status, error = FAILED, e
+        if self.on_result:
+            self.on_result(url, path, status, error)
+        return status
+
+    def export_one(self, url, path):
+        folder, name = os.path.split(path)
+        validators = self._folder_validators(folder)
+        headers = {}
+        if os.path.exists(path):
+            # Файл уже есть — спрашиваем сервер, изменился ли он
+            etag = validators.get(name)
+            if etag:
+                headers["If-None-Match"] = etag
+            headers["If-Modified-Since"] = formatdate(os.path.getmtime(path), usegmt=True)
+        with self.http.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return UNCHANGED
+            response.raise_for_status()
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp, path)
+            etag = response.headers.get("ETag")
+            modified = response.headers.get("Last-Modified")
+        if modified:
+            # Время файла = время на сервере, чтобы If-Modified-Since работал и без ETag
+            try:
+                ts = parsedate_to_datetime(modified).timestamp()
+                os.utime(path, (ts, ts))
+            except (TypeError, ValueError, OverflowError):
+                pass
+        with self._lock:
+            if etag:
+                validators[name] = etag
+            else:
+                validators.pop(name, None)
+        return SAVED
+
+    def _folder_validators(self, folder):
+        with self._lock:
+            if folder not in self._validators:
+                try:
+                    with open(os.path.join(folder, VALIDATORS_FILE), "r", encoding="utf-8") as f:
+                        self._validators[folder] = json.load(f)
+                except (OSError, ValueError):
+                    self._validators[folder] = {}
+            return self._validators[folder]
+
+    def _save_validators(self, folder):
+        with self._lock:
+            data = dict(self._validators.get(folder) or {})
+        if not data:
+            return
+        try:
+            with open(os.path.join(folder, VALIDATORS_FILE), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError:
+            pass
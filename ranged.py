@@ -0,0 +1,268 @@
+# 📦 Загрузка одного большого файла в несколько соединений по диапазонам байт (Range).
+# Файл заранее размечается на полный размер, куски пишутся сразу на свои места —
+# склеивать потом нечего. Размер куска подстраивается под скорость соединения,
+# упавший кусок повторяется с того места, где оборвался. Готовые диапазоны
+# сохраняются рядом (.ranges.json), так что прерванная загрузка продолжается
+import os
+import json
+import time
+import threading
+
+from http_client import HttpClient
+
+RANGED_CONNECTIONS = 4               # соединений на один файл
+RANGED_MIN_SIZE = 8 * 1024 * 1024    # файлы меньше качаются как обычно, одним запросом
+RANGED_HOST_CONNECTIONS = 32         # общий предел соединений к одному хосту для всех загрузок
+INITIAL_CHUNK = 1024 * 1024
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 32 * 1024 * 1024
+CHUNK_SECONDS = 2.0                  # кусок подбирается так, чтобы качаться примерно столько
+CHUNK_RETRIES = 5
+RETRY_BACKOFF = 0.5                  # 0.5, 1, 2, 4, 8 с
+READ_SIZE = 256 * 1024
+PROGRESS_INTERVAL = 0.25
+
+PART_SUFFIX = ".ranged"              # не .part: его формат понимает только yt-dlp
+STATE_SUFFIX = ".ranges.json"
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def media_client():
+    # Отдельный пул для медиа: большие загрузки не отнимают соединения у превью
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(per_host=RANGED_HOST_CONNECTIONS)
+        return _client
+
+
+def probe_size(url, headers=None, http=None):
+    # Полный размер файла, если сервер отдаёт диапазоны; иначе RangeNotSupported
+    http = http or media_client()
+    response = http.get(url, headers=dict(headers or {}, Range="bytes=0-0"), stream=True)
+    try:
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code != 206 or "/" not in content_range:
+            raise RangeNotSupported(url)
+        total = content_range.rsplit("/", 1)[1]
+        if not total.isdigit():
+            raise RangeNotSupported(url)
+        return int(total)
+    finally:
+        response.close()
+
+
+def part_files(path):
+    return [path + PART_SUFFIX, path + PART_SUFFIX + STATE_SUFFIX]
+
+
+class RangedDownload:
+    # hook(d) получает словари в формате progress_hooks yt-dlp — один общий прогресс на файл.
+    # Исключение из hook (например, отмена задачи) останавливает все соединения
+    def __init__(self, url, path, total, headers=None, connections=RANGED_CONNECTIONS, hook=None, http=None):
+        self.url = url
+        self.path = path
+        self.total = total
+        self.headers = headers or {}
+        self.connections = max(1, connections)
+        self.hook = hook
+        self.http = http or media_client()
+        self.part_path, self.state_path = part_files(path)
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._gaps = []   # [start, end] включительно — что ещё не роздано
+        self._done = []   # [start, end] — что уже на диске
+        self._error = None
+        self._stop = threading.Event()
+        self._downloaded = 0
+        self._session_bytes = 0
+        self._started = None
+        self._reported = 0.0
+
+    def run(self):
+        self._prepare()
+        self._started = time.time()
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.connections)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if self._error:
+            self._save_state()
+            raise self._error
+        os.replace(self.part_path, self.path)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        self._report("finished")
+        return self.path
+
+    # --- разметка и продолжение ---
+
+    def _prepare(self):
+        done = []
+        if os.path.exists(self.part_path) and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("total") == self.total and os.path.getsize(self.part_path) == self.total:
+                    done = sorted([int(a), int(b)] for a, b in state.get("done") or [])
+            except (OSError, ValueError, TypeError):
+                done = []
+        if not done:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.total)
+        self._done = done
+        self._downloaded = sum(b - a + 1 for a, b in done)
+        # Пробелы между готовыми диапазонами — это и есть работа
+        pos = 0
+        for a, b in done:
+            if a > pos:
+                self._gaps.append([pos, a - 1])
+            pos = max(pos, b + 1)
+        if pos < self.total:
+            self._gaps.append([pos, self.total - 1])
+
+    def _save_state(self):
+        with self._lock:
+            state = {"total": self.total, "done": [list(r) for r in self._done]}
+        with self._state_lock:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+
+    def _take(self, size):
+        # Следующий кусок из первого пробела; под конец куски мельче, чтобы никто не ждал одного
+        with self._lock:
+            if not self._gaps:
+                return None
+            left = sum(b - a + 1 for a, b in self._gaps)
+            size = max(MIN_CHUNK, min(size, left // self.connections or MIN_CHUNK))
+            gap = self._gaps[0]
+            start = gap[0]
+            end = min(gap[1], start + size - 1)
+            if end == gap[1]:
+                self._gaps.pop(0)
+            else:
+                gap[0] = end + 1
+            return start, end
+
+    def _mark_done(self, start, end):
+        with self._lock:
+            if self._done and self._done[-1][1] + 1 == start:
+                self._done[-1][1] = end
+            else:
+                self._done.append([start, end])
+                self._done.sort()
+
+    # --- соединения ---
+
+    def _worker(self):
+        chunk = INITIAL_CHUNK
+        try:
+            with open(self.part_path, "r+b") as f:
+                while not self._stop.is_set():
+                    rng = self._take(chunk)
+                    if rng is None:
+                        return
+                    t = time.time()
+                    self._fetch(f, *rng)
+                    # Кусок на следующий раз — сколько это соединение успевает за CHUNK_SECONDS
+                    rate = (rng[1] - rng[0] + 1) / max(time.time() - t, 1e-3)
+                    chunk = int(min(MAX_CHUNK, max(MIN_CHUNK, rate * CHUNK_SECONDS)))
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _fetch(self, f, start, end):
+        # Один кусок с повторами; после обрыва запрашивается только недостающий хвост
+        pos, attempt = start, 0
+        try:
+            while pos <= end:
+                if self._stop.is_set():
+                    raise self._error or RuntimeError("загрузка остановлена")
+                try:
+                    response = self.http.get(self.url, headers=dict(self.headers, Range=f"bytes={pos}-{end}"), stream=True)
+                    try:
+                        if response.status_code != 206:
+                            raise RangeNotSupported(f"HTTP {response.status_code} на запрос диапазона")
+                        f.seek(pos)
+                        for data in response.iter_content(READ_SIZE):
+                            data = data[:end - pos + 1]
+                            f.write(data)
+                            pos += len(data)
+                            self._add(len(data))
+                            if pos > end or self._stop.is_set():
+                                break
+                    finally:
+                        response.close()
+                    if pos <= end and not self._stop.is_set():
+                        raise IOError(f"соединение оборвалось на байте {pos}")
+                except RangeNotSupported:
+                    raise
+                except Exception:
+                    # Остановка (отмена задачи, ошибка в другом соединении) — не повод повторять
+                    if self._stop.is_set():
+                        raise
+                    attempt += 1
+                    if attempt > CHUNK_RETRIES:
+                        raise
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        except BaseException:
+            # Пауза, отмена или ошибка: записанное начало куска тоже сохраняется,
+            # чтобы продолжение не качало его заново
+            if pos > start:
+                f.flush()
+                self._mark_done(start, pos - 1)
+            raise
+        f.flush()
+        self._mark_done(start, end)
+        self._save_state()
+
+    def _add(self, count):
+        with self._lock:
+            self._downloaded += count
+            self._session_bytes += count
+            now = time.time()
+            if now - self._reported < PROGRESS_INTERVAL:
+                return
+            self._reported = now
+        try:
+            # Хук может бросить паузу или отмену — остальные соединения тогда тоже встают
+            self._report("downloading")
+        except BaseException as e:
+            self._fail(e)
+            raise
+
+    def _report(self, status):
+        if not self.hook:
+            return
+        with self._lock:
+            done = self._downloaded
+            speed = self._session_bytes / max(time.time() - self._started, 1e-3)
+        self.hook({
+            "status": status,
+            "filename": self.path,
+            "downloaded_bytes": done,
+            "total_bytes": self.total,
+            "speed": speed,
+            "_percent_str": f"{done * 100 / self.total:.1f}%",
+            "_speed_str": f"{speed / 1024 / 1024:.2f}MiB/s",
+            "_eta_str": f"{int((self.total - done) / speed)}s" if speed else "",
+            "total_bytes_str": f"{self.total / 1024 / 1024:.1f}MiB",
+        })
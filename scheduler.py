@@ -0,0 +1,309 @@
+# 📦 Планировщик загрузок: пул воркеров, лимит на хост, приоритеты, пауза/отмена.
+# Сведение (ffmpeg) идёт отдельной очередью со своим лимитом процессов
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque, Counter
+from urllib.parse import urlparse
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 3
+DEFAULT_POST_WORKERS = os.cpu_count() or 2
+
+QUEUED = "queued"
+RUNNING = "running"
+MERGING = "merging"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobPaused(Exception):
+    # Задачу поставили на паузу: она выходит из воркера и освобождает его и место хоста.
+    # Недокачанное (.part, .ranged) остаётся на диске, после снятия паузы задача продолжает с него
+    pass
+
+
+_PAUSED = object()
+
+
+def host_of(url):
+    host = urlparse(url).hostname or ""
+    # youtu.be и www.youtube.com — один и тот же сервер
+    if host.startswith("www."):
+        host = host[4:]
+    if host == "youtu.be":
+        host = "youtube.com"
+    return host
+
+
+class Job:
+    def __init__(self, key, func, url, priority=0):
+        self.key = key
+        self.func = func
+        self.url = url
+        self.host = host_of(url)
+        self.priority = priority
+        self.state = QUEUED
+        self.progress = {}
+        self.streams = {}  # файл -> [скачано, всего, скорость]: у задачи может быть несколько потоков сразу
+        self.error = None
+        self.created = time.time()
+        self.started = None  # время, когда воркер взял задачу
+        self._cancel = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def check(self):
+        # Вызывается из хуков прогресса: прерывает задачу при отмене и при паузе
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        if not self._resume.is_set():
+            raise JobPaused(self.key)
+
+
+class DownloadScheduler:
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, on_update=None,
+                 post_workers=DEFAULT_POST_WORKERS):
+        self.per_host = per_host
+        self.on_update = on_update
+        self.jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._host_running = {}
+        self._cond = threading.Condition()
+        self._target_workers = 0
+        self._alive_workers = 0
+        self._stopped = False
+        # Очередь сведения: воркер загрузки отдаёт туда шаг и сразу берёт следующую задачу
+        self._post_queue = deque()
+        self._post_cond = threading.Condition()
+        for _ in range(max(1, int(post_workers))):
+            threading.Thread(target=self._post_worker, daemon=True).start()
+        self.set_workers(workers)
+
+    # --- управление пулом ---
+
+    def set_workers(self, count):
+        count = max(1, int(count))
+        with self._cond:
+            self._target_workers = count
+            while self._alive_workers < count:
+                self._alive_workers += 1
+                threading.Thread(target=self._worker, daemon=True).start()
+            # Лишние воркеры сами завершатся, когда проснутся
+            self._cond.notify_all()
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            for job in self.jobs.values():
+                job._cancel.set()
+                job._resume.set()
+            self._cond.notify_all()
+        with self._post_cond:
+            self._post_cond.notify_all()
+
+    # --- задачи ---
+
+    def submit(self, key, func, url, priority=0):
+        # func(job) выполняется в воркере загрузки. Если она вернула функцию,
+        # та выполнится в очереди сведения (MERGING), а воркер освободится.
+        # Повторная постановка заменяет завершённую задачу
+        with self._cond:
+            old = self.jobs.get(key)
+            if old and old.state in (QUEUED, RUNNING, PAUSED, MERGING):
+                return old
+            job = Job(key, func, url, priority)
+            self.jobs[key] = job
+            self._push(job)
+            self._cond.notify()
+        self._notify(job)
+        return job
+
+    def set_priority(self, key, priority):
+        with self._cond:
+            job = self.jobs.get(key)
+            if not job or job.state not in (QUEUED, PAUSED):
+                return
+            job.priority = priority
+            # Старая запись в куче станет «просроченной» и будет пропущена
+            self._push(job)
+            self._cond.notify()
+
+    def pause(self, key):
+        with self._cond:
+            job = self.jobs.get(key)
+            if not job or job.state not in (QUEUED, RUNNING):
+                return
+            job._resume.clear()
+            job.state = PAUSED
+        self._notify(job)
+
+    def resume(self, key):
+        with self._cond:
+            job = self.jobs.get(key)
+            if not job or job.state != PAUSED:
+                return
+            job._resume.set()
+            if job.progress.get("started"):
+                # Воркер ещё не успел выйти из задачи — она просто продолжается
+                job.state = RUNNING
+            else:
+                # Из кучи (или из воркера) задача на паузе выпала — возвращаем её в очередь
+                job.state = QUEUED
+                self._push(job)
+                self._cond.notify()
+        self._notify(job)
+
+    def cancel(self, key):
+        with self._cond:
+            job = self.jobs.get(key)
+            if not job or job.state in (DONE, FAILED, CANCELLED):
+                return
+            job._cancel.set()
+            job._resume.set()
+            if not job.progress.get("started"):
+                job.state = CANCELLED
+        self._notify(job)
+
+    def report(self, job, **progress):
+        # Воркер сообщает о прогрессе; состояние отдаётся в on_update
+        job.progress.update(progress)
+        self._notify(job)
+
+    def counts(self):
+        # Число задач в каждом состоянии — для статистики
+        with self._cond:
+            return dict(Counter(j.state for j in self.jobs.values()))
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for j in self.jobs.values() if j.state in (QUEUED, RUNNING, PAUSED, MERGING))
+
+    # --- внутреннее ---
+
+    def _push(self, job):
+        # Больший приоритет — раньше; при равенстве — в порядке постановки
+        heapq.heappush(self._heap, (-job.priority, next(self._counter), job))
+
+    def _take(self):
+        # Берём самую приоритетную задачу, чей хост не упёрся в лимит
+        skipped = []
+        found = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            neg_prio, _, job = entry
+            if job.state != QUEUED or -neg_prio != job.priority or self.jobs.get(job.key) is not job:
+                continue  # отменена, на паузе или просрочена
+            if self._host_running.get(job.host, 0) >= self.per_host:
+                skipped.append(entry)
+                continue
+            found = job
+            break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopped and self._alive_workers <= self._target_workers:
+                    job = self._take()
+                    if job:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    self._alive_workers -= 1
+                    return
+                job.state = RUNNING
+                job.progress["started"] = True
+                job.started = time.time()
+                self._host_running[job.host] = self._host_running.get(job.host, 0) + 1
+            self._notify(job)
+            paused = self._run(job) is _PAUSED
+            with self._cond:
+                self._host_running[job.host] -= 1
+                if paused:
+                    # Воркер и место хоста свободны; resume вернёт задачу в очередь.
+                    # Если паузу уже сняли, пока задача выходила, — сразу в очередь
+                    job.progress["started"] = False
+                    if job.cancelled:
+                        job.state = CANCELLED
+                    elif job.state != PAUSED:
+                        job.state = QUEUED
+                        self._push(job)
+                self._cond.notify_all()
+            self._notify(job)
+
+    def _run(self, job):
+        post = self._call(job, job.func)
+        if post is _PAUSED:
+            return post
+        if job.state not in (RUNNING, PAUSED):
+            return
+        if callable(post):
+            # Сведение на паузу не ставится: загрузка уже закончилась
+            job._resume.set()
+            job.state = MERGING
+            with self._post_cond:
+                self._post_queue.append((job, post))
+                self._post_cond.notify()
+        else:
+            job.state = DONE
+
+    def _post_worker(self):
+        while True:
+            with self._post_cond:
+                while not self._post_queue and not self._stopped:
+                    self._post_cond.wait()
+                if self._stopped:
+                    return
+                job, post = self._post_queue.popleft()
+            self._call(job, lambda job: post())
+            if job.state == MERGING:
+                job.state = DONE
+            self._notify(job)
+
+    def _call(self, job, func):
+        # Результат func(job); при ошибке или отмене состояние задачи меняется здесь
+        try:
+            job.check()
+            return func(job)
+        except JobCancelled:
+            job.state = CANCELLED
+        except JobPaused:
+            return _PAUSED
+        except Exception as e:
+            if job.cancelled:
+                job.state = CANCELLED
+            else:
+                job.error = e
+                job.state = FAILED
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception:
+                pass
@@ -0,0 +1,123 @@
+# 📦 Окно статистики: этапы каждой задачи, скорость, очередь, задержка Tk; экспорт и профилировщик
+from tkinter import Toplevel, Frame, Label, Button, Text, Scrollbar, filedialog
+
+from metrics import SamplingProfiler
+
+STATS_REFRESH_MS = 1000
+STATS_MAX_ROWS = 200
+STAGE_COLUMNS = ("queue", "extract", "download", "merge_queue", "merge")
+
+
+def _fmt_seconds(value):
+    return f"{value:8.2f}" if value else f"{'-':>8}"
+
+
+class StatsWindow:
+    def __init__(self, root, metrics, log=print):
+        self.root = root
+        self.metrics = metrics
+        self.log = log
+        self.profiler = None
+
+        self.win = Toplevel(root)
+        self.win.title("Статистика загрузок")
+        self.win.configure(bg="#fff0f5")
+        self.win.geometry("860x520")
+
+        self.summary = Label(self.win, bg="#fff0f5", fg="#800040", anchor="w", justify="left", font=("Consolas", 10))
+        self.summary.pack(fill="x", padx=6, pady=4)
+
+        body = Frame(self.win, bg="#fff0f5")
+        body.pack(fill="both", expand=True, padx=6)
+        self.table = Text(body, wrap="none", bg="#fff0f5", fg="#800040", font=("Consolas", 9), state="disabled")
+        scroll = Scrollbar(body, command=self.table.yview)
+        self.table.config(yscrollcommand=scroll.set)
+        self.table.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+
+        btns = Frame(self.win, bg="#fff0f5")
+        btns.pack(fill="x", pady=4)
+        Button(btns, text="Экспорт трассы (JSONL)", command=self.export_trace, bg="#ffe6f0").pack(side="left", padx=4)
+        Button(btns, text="Экспорт Prometheus", command=self.export_prometheus, bg="#ffe6f0").pack(side="left", padx=4)
+        self.profile_btn = Button(btns, text="▶ Профилировать", command=self.toggle_profiler, bg="#ffb3d9")
+        self.profile_btn.pack(side="right", padx=4)
+
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        if not self.exists():
+            return
+        counts = self.metrics.gauge_values().get("queue_depth", {})
+        lag = self.metrics.lag_stats()
+        rows = self.metrics.job_rows()
+        total_mb = sum(row["bytes"] for row in rows) / 1024 / 1024
+        queue = ", ".join(f"{state}: {n}" for state, n in sorted(counts.items())) or "пусто"
+        self.summary.config(text=(
+            f"Очередь — {queue}\n"
+            f"Задержка Tk — сейчас {lag['last'] * 1000:.0f} мс, средняя {lag['avg'] * 1000:.0f} мс, "
+            f"макс. {lag['max'] * 1000:.0f} мс    Скачано: {total_mb:.1f} МБ"
+        ))
+
+        header = f"{'Ролик':<40}" + "".join(f"{name:>12}" for name in STAGE_COLUMNS) + f"{'МБ':>9}{'МБ/с':>8}"
+        lines = [header, "-" * len(header)]
+        for row in rows[:STATS_MAX_ROWS]:
+            speed = f"{row['throughput'] / 1024 / 1024:8.2f}" if row["throughput"] else f"{'-':>8}"
+            lines.append(
+                f"{row['title'][:39]:<40}"
+                + "".join(f"    {_fmt_seconds(row['stages'].get(name))}" for name in STAGE_COLUMNS)
+                + f"{row['bytes'] / 1024 / 1024:9.1f}{speed}"
+            )
+        top = self.table.yview()[0]
+        self.table.config(state="normal")
+        self.table.delete("1.0", "end")
+        self.table.insert("end", "\n".join(lines))
+        self.table.config(state="disabled")
+        self.table.yview_moveto(top)
+        self.win.after(STATS_REFRESH_MS, self.refresh)
+
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(parent=self.win, defaultextension=".jsonl",
+                                            filetypes=[("JSON Lines", "*.jsonl")], title="Сохранить трассу")
+        if path:
+            count = self.metrics.export_trace(path)
+            self.log(f"Трасса сохранена ({count} интервалов): {path}")
+
+    def export_prometheus(self):
+        path = filedialog.asksaveasfilename(parent=self.win, defaultextension=".prom",
+                                            filetypes=[("Prometheus", "*.prom")], title="Сохранить метрики")
+        if path:
+            self.metrics.write_prometheus(path)
+            self.log(f"Метрики сохранены: {path}")
+
+    def toggle_profiler(self):
+        if self.profiler is None:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            self.profile_btn.config(text="■ Остановить профиль")
+            self.log("Профилировщик запущен")
+            return
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        self.profile_btn.config(text="▶ Профилировать")
+        self.log(f"Профиль: {profiler.samples} снимков. Горячие места:")
+        for name, count in profiler.hot(10):
+            self.log(f"  {count:6d}  {name}")
+        path = filedialog.asksaveasfilename(parent=self.win, defaultextension=".folded",
+                                            filetypes=[("Свёрнутые стеки", "*.folded")], title="Сохранить профиль")
+        if path:
+            profiler.write(path)
+            self.log(f"Профиль сохранён: {path}")
+
+    def close(self):
+        if self.profiler:
+            self.profiler.stop()
+            self.profiler = None
+        self.win.destroy()
+
+    def exists(self):
+        return self.win.winfo_exists()
+
+    def lift(self):
+        self.win.deiconify()
+        self.win.lift()
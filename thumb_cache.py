@@ -0,0 +1,222 @@
+# 📦 Двухуровневый кэш миниатюр: LRU готовых PhotoImage в памяти + файлы на диске
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from http_client import shared_client
+
+THUMB_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "thumbs")
+MAX_DISK_BYTES = 200 * 1024 * 1024
+MAX_MEMORY_ITEMS = 300
+THUMB_WORKERS = 4
+# Размеры, которые показывает интерфейс: список и окно истории.
+# Из одного исходника сразу готовятся все, и каждый хранится на диске уже уменьшенным
+THUMB_SIZES = ((120, 90), (60, 45))
+# Варианты превью YouTube по ширине — берём самый маленький, которого хватает
+YT_VARIANTS = (("default", 120), ("mqdefault", 320), ("hqdefault", 480), ("sddefault", 640), ("maxresdefault", 1920))
+_YT_THUMB_RE = re.compile(r"^(https?://[^/]+/vi(?:_webp)?/[A-Za-z0-9_-]{11}/)([A-Za-z0-9_]+)(\.\w+)")
+
+
+def thumb_key(url):
+    # https://img.youtube.com/vi/<id>/<res>.jpg -> "<id>/<res>"; прочие сайты — по самой ссылке
+    m = re.search(r"/vi(?:_webp)?/([A-Za-z0-9_-]{11})/([A-Za-z0-9_]+)\.", url)
+    if m:
+        return f"{m.group(1)}/{m.group(2)}"
+    return url
+
+
+def fitting_variant(url, size):
+    # .../vi/<id>/maxresdefault.jpg для 120x90 -> .../vi/<id>/default.jpg; прочие ссылки как есть
+    m = _YT_THUMB_RE.match(url or "")
+    if not m or m.group(2) not in dict(YT_VARIANTS):
+        return url
+    for name, width in YT_VARIANTS:
+        if width >= size[0]:
+            return f"{m.group(1)}{name}{m.group(3)}"
+    return url
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=THUMB_CACHE_DIR, max_disk_bytes=MAX_DISK_BYTES, max_memory=MAX_MEMORY_ITEMS, http=None):
+        self.cache_dir = cache_dir
+        self._http = http
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory = max_memory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self._pool = ThreadPoolExecutor(max_workers=THUMB_WORKERS, thread_name_prefix="thumbs")
+
+    @property
+    def http(self):
+        # Клиент (и requests) — при первом сетевом запросе
+        if self._http is None:
+            self._http = shared_client()
+        return self._http
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name + ".img")
+
+    # --- диск ---
+
+    def get_bytes(self, url, timeout=None, store=True):
+        # Диск -> сеть; сетевой ответ сохраняется в кэш, если store
+        if not url:
+            return None
+        path = self._path(thumb_key(url))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # отметка «недавно использовался» для вытеснения
+            return data
+        except OSError:
+            pass
+        response = self.http.get(url, timeout=timeout or self.http.timeout)
+        if response.status_code != 200 or not response.content:
+            return None
+        if store:
+            self._store(path, response.content)
+        return response.content
+
+    def _store(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_size()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _files(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".img"):
+                    yield os.path.join(root, name)
+
+    def _scan_size(self):
+        total = 0
+        for path in self._files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _evict(self):
+        # Удаляем самые давно использованные файлы, пока не уложимся в 80% лимита
+        entries = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                pass
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_disk_bytes * 0.8
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    # --- память ---
+
+    def peek_photo(self, url, size):
+        # Только память, без диска и сети
+        key = (thumb_key(url), size)
+        with self._lock:
+            photo = self._memory.get(key)
+            if photo is not None:
+                self._memory.move_to_end(key)
+            return photo
+
+    def _remember(self, url, size, img):
+        # Только из Tk-потока: PhotoImage привязан к интерпретатору Tk
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(img)
+        with self._lock:
+            self._memory[(thumb_key(url), size)] = photo
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+        return photo
+
+    def _sized_path(self, url, size):
+        name = hashlib.sha1(thumb_key(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], f"{name}_{size[0]}x{size[1]}.img")
+
+    def _load_image(self, url, size):
+        # Сначала готовая уменьшенная копия; исходник декодируется не больше одного раза
+        from PIL import Image  # Pillow — при первой миниатюре, не при запуске
+        path = self._sized_path(url, size)
+        try:
+            img = Image.open(path)
+            img.load()
+            os.utime(path)
+            return img
+        except OSError:
+            pass
+        data = self.get_bytes(fitting_variant(url, size), store=False) or self.get_bytes(url, store=False)
+        if not data:
+            raise ValueError(f"нет превью: {url}")
+        return self._build_sizes(url, data, size)
+
+    def _build_sizes(self, url, data, size):
+        from PIL import Image
+        sizes = list(THUMB_SIZES) if size in THUMB_SIZES else [size]
+        src = Image.open(BytesIO(data))
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8) — в разы дешевле полного
+        src.draft("RGB", max(sizes))
+        src = src.convert("RGB")
+        result = None
+        for s in sizes:
+            img = src.resize(s, Image.LANCZOS)
+            buf = BytesIO()
+            img.save(buf, "JPEG", quality=85)
+            self._store(self._sized_path(url, s), buf.getvalue())
+            if s == size:
+                result = img
+        return result
+
+    def get_photo(self, url, size):
+        # Синхронно, из Tk-потока
+        photo = self.peek_photo(url, size)
+        if photo is not None:
+            return photo
+        return self._remember(url, size, self._load_image(url, size))
+
+    def get_photo_async(self, url, size, callback, schedule):
+        # Скачивание и декодирование — в фоне; PhotoImage создаётся в Tk-потоке.
+        # schedule(fn) должен выполнить fn в Tk-потоке (например, через root.after);
+        # callback(photo) получает None, если превью нет
+        photo = self.peek_photo(url, size)
+        if photo is not None:
+            callback(photo)
+            return
+
+        def worker():
+            try:
+                img = self._load_image(url, size)
+            except Exception:
+                img = None
+            schedule(lambda: callback(self._remember(url, size, img) if img is not None else None))
+
+        self._pool.submit(worker)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
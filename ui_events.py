@@ -0,0 +1,103 @@
+# 📦 Диспетчер событий между рабочими потоками и циклом Tk.
+# Потоки только кладут события в очередь (post / call) — Tk-виджеты они не трогают.
+# Цикл Tk раз в UI_TICK_MS забирает всё накопленное одной пачкой: события одного типа
+# отдаются обработчику списком, так что, например, 50 новых роликов — одна перерисовка, а не 50
+import time
+import threading
+import traceback
+from collections import deque
+
+UI_TICK_MS = 100
+UI_BATCH_LIMIT = 500  # больше за один тик не разбираем, остаток — на следующем
+
+# Типы событий
+ITEM_READY = "item_ready"      # (data,) — разобранная ссылка для списка
+JOB_RESUME = "job_resume"      # (data, row) — незавершённая задача из журнала
+CALL = "call"                  # (fn,) — произвольная функция для Tk-потока
+
+
+class UiDispatcher:
+    def __init__(self, root, tick_ms=UI_TICK_MS, batch_limit=UI_BATCH_LIMIT, on_lag=None, log=print):
+        self.root = root
+        self.tick_ms = tick_ms
+        self.batch_limit = batch_limit
+        self.on_lag = on_lag  # on_lag(секунды) — насколько тик опоздал
+        self.log = log  # ошибки обработчиков — в лог приложения, вместе с трассировкой
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._handlers = {CALL: self._run_calls}
+        self._tick_hooks = []
+        self._due = None
+        self._after_id = None
+
+    def on(self, kind, handler):
+        # handler(список кортежей-аргументов) вызывается в Tk-потоке раз за тик
+        self._handlers[kind] = handler
+
+    def every_tick(self, hook):
+        # hook() — в конце каждого тика, после событий (перенос лога и прогресса)
+        self._tick_hooks.append(hook)
+
+    # --- из любого потока ---
+
+    def post(self, kind, *args):
+        with self._lock:
+            self._events.append((kind, args))
+
+    def call(self, fn):
+        # Замена root.after(0, fn) для рабочих потоков
+        self.post(CALL, fn)
+
+    def pending(self):
+        return len(self._events)
+
+    # --- Tk-поток ---
+
+    def start(self):
+        self._due = time.perf_counter() + self.tick_ms / 1000
+        self._after_id = self.root.after(self.tick_ms, self._tick)
+
+    def stop(self):
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        if self.on_lag and self._due is not None:
+            self.on_lag(time.perf_counter() - self._due)
+        with self._lock:
+            count = min(len(self._events), self.batch_limit)
+            events = [self._events.popleft() for _ in range(count)]
+        # Группируем по типу, сохраняя порядок первых появлений
+        batches = {}
+        for kind, args in events:
+            batches.setdefault(kind, []).append(args)
+        for kind, batch in batches.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                continue
+            try:
+                handler(batch)
+            except Exception:
+                self._report(f"Ошибка обработчика {kind}")
+        for hook in self._tick_hooks:
+            try:
+                hook()
+            except Exception:
+                self._report("Ошибка тика UI")
+        self._due = time.perf_counter() + self.tick_ms / 1000
+        self._after_id = self.root.after(self.tick_ms, self._tick)
+
+    def _run_calls(self, batch):
+        for (fn,) in batch:
+            try:
+                fn()
+            except Exception:
+                self._report("Ошибка в вызове из потока")
+
+    def _report(self, title):
+        # Вызывать только из except: трассировка берётся у текущего исключения
+        try:
+            self.log(f"{title}:\n{traceback.format_exc().rstrip()}")
+        except Exception:
+            traceback.print_exc()  # сломался сам лог — хотя бы в консоль
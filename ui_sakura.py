@@ -1,81 +1,130 @@
 # 📦 Импорт нужных классов и функций из tkinter (графический интерфейс)
 from tkinter import (
-    Label, Entry, Button, StringVar, OptionMenu, filedialog,
-    Text, Frame, Toplevel, Canvas, Scrollbar, Listbox, SINGLE, END
+    Label, Entry, Button, StringVar, IntVar, BooleanVar, Checkbutton, OptionMenu, filedialog,
+    Text, Frame, Toplevel, Canvas, Scrollbar, Spinbox, Listbox, SINGLE, END, TclError
 )
 
 # 📦 Импорт сторонних и стандартных библиотек
 import os
 import sys
-import json
-import requests
-from PIL import Image, ImageTk
-from io import BytesIO
-import yt_dlp
 import threading
-import subprocess
-
-# ffmpeg_dir = r"D:\github\z3552_inj_prog\ffmpeg\bin"
-ffmpeg_dir = os.path.join(os.path.dirname(__file__), "ffmpeg", "bin")
-if ffmpeg_dir not in os.environ.get("PATH", ""):
-    os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
-
-HISTORY_PATH = os.path.join(os.path.dirname(__file__), "history", "history.json")
-
-class HistoryManager:
-    def __init__(self, path=HISTORY_PATH, max_items=10):
-        self.path = path
-        self.max_items = max_items
-        self.history = self.load_history()
-
-    def load_history(self):
-        if os.path.exists(self.path):
-            with open(self.path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
-
-    def save_history(self):
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.history[:self.max_items], f, ensure_ascii=False, indent=2)
-
-    def add(self, url, thumb_url):
-        # Удалить дубликаты
-        self.history = [h for h in self.history if h["url"] != url]
-        self.history.insert(0, {"url": url, "thumb_url": thumb_url})
-        self.save_history()
-
-class YTDLLogger:
-    def __init__(self, log_func):
-        self.log_func = log_func
-    def debug(self, msg):
-        pass
-    def warning(self, msg):
-        self.log_func(f"[yt-dlp] WARNING: {msg}")
-    def error(self, msg):
-        self.log_func(f"[yt-dlp] ERROR: {msg}")
-
-def ytdl_hook(d, log_func):
-    if d['status'] == 'downloading':
-        percent = d.get('_percent_str', '').strip()
-        speed = d.get('_speed_str', '').strip()
-        eta = d.get('_eta_str', '').strip()
-        line = f"[download] {percent} of {d.get('total_bytes_str','?')} at {speed} ETA {eta}"
-        log_func(line)
-    elif d['status'] == 'finished':
-        log_func(f"[download] Done: {d.get('filename','')}")
+from thumb_cache import ThumbnailCache, THUMB_SIZES, THUMB_CACHE_DIR
+from meta_cache import MetadataCache, extract_video_id, cache_key, META_CACHE_DIR
+from journal import JobJournal, JOURNAL_PATH
+from library import LibraryIndex, LIBRARY_PATH
+from history_store import HistoryManager, HISTORY_DB_PATH, HISTORY_PATH
+from history_window import HistoryWindow
+from stats_window import StatsWindow
+from preview_export import PreviewExporter, preview_ext, SAVED, UNCHANGED, FAILED as FAILED_PREVIEW
+from log_sink import LogSink, LOG_FILE_PATH, MAX_LOG_LINES
+from ui_events import UiDispatcher, ITEM_READY, JOB_RESUME
+from ingest import BulkIngestor, parse_bulk_text, read_url_file, is_collection_url
+from engine import DownloadEngine, warm_up, DUB_ALL_LABEL, DEFAULT_AUDIO_FORMAT, sanitize_filename, download_subtitles
+from media import AUDIO_FORMATS
+from scheduler import DEFAULT_WORKERS, QUEUED, RUNNING, MERGING, PAUSED, CANCELLED, DONE, FAILED
+
+# Список роликов: фиксированная высота строки и запас строк за краями окна
+ROW_HEIGHT = 170
+ROW_PAD = 6
+ROW_OVERSCAN = 2
+LIST_THUMB_SIZE = THUMB_SIZES[0]
 
 class SakuraDownloader:
-    def __init__(self, root):
+    def __init__(self, root, data_dir=None):
+        # data_dir — своя папка для всех баз и кэшей (замеры, отдельный профиль);
+        # по умолчанию всё лежит рядом с программой
         self.root = root
+        self.data_dir = data_dir
         self.url = StringVar()
         self.output_path = StringVar()
         self.thumb_resolution = StringVar(value="maxresdefault")
+        self.audio_format = StringVar(value=DEFAULT_AUDIO_FORMAT)
         self.selected_item = None
         self.download_items = []
-        self.history_manager = HistoryManager()
+        self._rows = {}  # id(item) -> (item, frame, canvas window, индекс)
+        self._history_manager = None  # SQLite открывается не в конструкторе, см. history_manager
+        self._history_lock = threading.Lock()
+        self._library = None  # так же лениво, см. library
+        self._library_lock = threading.Lock()
+        self._journal = None  # и журнал задач, см. journal
+        self._journal_lock = threading.Lock()
+        self.history_window = None
+        self.stats_window = None
+        self.thumb_cache = ThumbnailCache(self._data_path("thumbs", THUMB_CACHE_DIR))
         self.log_output = None
+        self.log_sink = LogSink()
+        self.log_to_file = BooleanVar(value=False)
+        self.workers_var = IntVar(value=DEFAULT_WORKERS)
+        self._workers = DEFAULT_WORKERS
+        self.engine = DownloadEngine(
+            workers=DEFAULT_WORKERS,
+            on_update=self._on_job_update,
+            log=self.log_sink.write,
+            trace=self.log_sink.trace,
+            check_previews=True,
+            meta_cache=MetadataCache(self._data_path("meta", META_CACHE_DIR)),
+        )
+        self.scheduler = self.engine.scheduler
+        # Всё, что рабочие потоки хотят показать в окне, идёт через диспетчер;
+        # он же меряет задержку цикла Tk по опозданию своего тика
+        self.events = UiDispatcher(root, on_lag=self.engine.metrics.observe_lag, log=self.log_sink.write)
+        self.events.on(ITEM_READY, self._on_items_ready)
+        self.events.on(JOB_RESUME, self._on_jobs_resume)
+        self.events.every_tick(self._flush_log)
+        self.engine.metrics.gauge("ui_events", self.events.pending)
         self.build_ui()
+        # Сначала окно, потом тяжёлое: yt_dlp, requests и история догружаются в фоне
+        self.root.after(100, self._warm_up)
+
+    def _data_path(self, name, default):
+        return os.path.join(self.data_dir, name) if self.data_dir else default
+
+    @property
+    def history_manager(self):
+        # Открывается при первом обращении — из фона сразу после показа окна или по кнопке
+        with self._history_lock:
+            if self._history_manager is None:
+                self._history_manager = HistoryManager(self._data_path("history.sqlite3", HISTORY_DB_PATH),
+                                                       json_path=self._data_path("history.json", HISTORY_PATH))
+            return self._history_manager
+
+    @property
+    def library(self):
+        # Как и история: открывается в фоне после показа окна или при первой загрузке
+        with self._library_lock:
+            if self._library is None:
+                self._library = LibraryIndex(self._data_path("library.sqlite3", LIBRARY_PATH))
+                self.engine.library = self._library
+            return self._library
+
+    def _apply_workers(self, event=None):
+        try:
+            count = min(16, max(1, int(self.workers_var.get())))
+        except (TclError, ValueError):
+            count = self._workers  # не число — возвращаем прежнее значение
+        self.workers_var.set(count)
+        if count != self._workers:
+            self._workers = count
+            self.scheduler.set_workers(count)
+
+    @property
+    def journal(self):
+        # Тоже не в конструкторе: запуск окна обходится без SQLite
+        with self._journal_lock:
+            if self._journal is None:
+                self._journal = JobJournal(self._data_path("jobs.sqlite3", JOURNAL_PATH))
+                self.engine.journal = self._journal
+            return self._journal
+
+    def _warm_up(self):
+        def worker():
+            self.history_manager
+            self.library
+            self.journal
+            # Задачи, прерванные закрытием или падением программы
+            self.events.call(self.resume_unfinished_jobs)
+            warm_up()
+        threading.Thread(target=worker, daemon=True).start()
 
     def build_ui(self):
         self.root.geometry("1000x750")
@@ -107,7 +156,17 @@ class SakuraDownloader:
         entry_url = Entry(urlf, textvariable=self.url, width=50)
         entry_url.pack(side="left", padx=(0, 5))
         Button(urlf, text="➕ Добавить", command=self.add_to_list, bg="#ffe6f0", width=12).pack(side="left", padx=(0, 5))
+        Button(urlf, text="Пакетно", command=self.show_bulk_dialog, bg="#ffe6f0", width=8).pack(side="left", padx=(0, 5))
         Button(urlf, text="История", command=self.show_history, bg="#ffe6f0", width=10).pack(side="left")
+        Button(urlf, text="📊", command=self.show_stats, bg="#ffe6f0").pack(side="left", padx=(5, 0))
+        Button(urlf, text="📚", command=self.rescan_library, bg="#ffe6f0").pack(side="left", padx=(5, 0))
+        # Число одновременных загрузок
+        Label(urlf, text="Потоков:", bg="#fff0f5").pack(side="left", padx=(10, 2))
+        workers_box = Spinbox(urlf, from_=1, to=16, width=3, textvariable=self.workers_var, command=self._apply_workers)
+        workers_box.pack(side="left")
+        # command срабатывает только на стрелках — введённое руками применяем по Enter и при уходе фокуса
+        workers_box.bind("<Return>", self._apply_workers)
+        workers_box.bind("<FocusOut>", self._apply_workers)
 
         # --- Только это! ---
         def paste_clipboard(event=None):
@@ -125,31 +184,37 @@ class SakuraDownloader:
         # Кнопки групповой загрузки (компактно и по центру)
         groupf = Frame(frame, bg="#fff0f5")
         groupf.grid(row=3, column=0, columnspan=6, pady=10)
-        for i in range(5):
+        for i in range(7):
             groupf.grid_columnconfigure(i, weight=1)
         Button(groupf, text="Скачать все субтитры", command=self.download_all_subs, bg="#ffe6f0", width=18).grid(row=0, column=0, padx=4)
         Button(groupf, text="Скачать все превью", command=self.download_all_previews, bg="#ffe6f0", width=18).grid(row=0, column=1, padx=4)
         Button(groupf, text="Скачать все ролики", command=self.download_all_videos, bg="#ffe6f0", width=18).grid(row=0, column=2, padx=4)
         Button(groupf, text="Скачать всё", command=self.download_everything, bg="#ff99cc", width=14).grid(row=0, column=3, padx=4)
         Button(groupf, text="Очистить список", command=self.clear_all_items, bg="#ffb3d9", width=16).grid(row=0, column=4, padx=4)
+        # Только звук: формат общий для кнопок 🎵 в строках и для пакетной кнопки
+        Button(groupf, text="🎵 Весь звук", command=self.download_all_audio, bg="#ffe6f0", width=12).grid(row=0, column=5, padx=(4, 0))
+        OptionMenu(groupf, self.audio_format, *AUDIO_FORMATS).grid(row=0, column=6, padx=(2, 4))
 
         # Логи на всю ширину
         Label(frame, text="Лог:", bg="#fff0f5").grid(row=5, column=0, columnspan=6, sticky="w", pady=(15, 0))
+        Checkbutton(
+            frame, text="писать полный лог в файл", variable=self.log_to_file,
+            command=self._toggle_log_file, bg="#fff0f5"
+        ).grid(row=5, column=0, columnspan=6, sticky="e", pady=(15, 0))
         self.log_output = Text(frame, height=14, wrap="word", bg="#fff0f5", fg="#800040", state="disabled", font=("Consolas", 10))
         self.log_output.grid(row=6, column=0, columnspan=6, sticky="nsew", padx=2, pady=2)
         log_scroll = Scrollbar(frame, command=self.log_output.yview)
         self.log_output.config(yscrollcommand=log_scroll.set)
         log_scroll.grid(row=6, column=6, sticky="ns")
+        self.events.start()
 
-        # Список роликов (items_frame) с прокруткой
+        # Список роликов с прокруткой: виджеты есть только у видимых строк
         self.vid_canvas = Canvas(frame, bg="#fff0f5", highlightthickness=0, height=220)
         self.vid_scrollbar = Scrollbar(frame, orient="vertical", command=self.vid_canvas.yview)
-        self.vid_canvas.configure(yscrollcommand=self.vid_scrollbar.set)
+        self.vid_canvas.configure(yscrollcommand=self._on_vid_scroll)
         self.vid_canvas.grid(row=2, column=0, columnspan=6, sticky="nsew", pady=(10, 0))
         self.vid_scrollbar.grid(row=2, column=6, sticky="ns", pady=(10, 0))
-        self.items_frame = Frame(self.vid_canvas, bg="#fff0f5")
-        self.vid_canvas.create_window((0, 0), window=self.items_frame, anchor="nw")
-        self.items_frame.bind("<Configure>", lambda e: self.vid_canvas.configure(scrollregion=self.vid_canvas.bbox("all")))
+        self.vid_canvas.bind("<Configure>", self._on_vid_configure)
         self.vid_canvas.bind("<Enter>", lambda e: self.vid_canvas.bind_all("<MouseWheel>", self._on_mousewheel_vid))
         self.vid_canvas.bind("<Leave>", lambda e: self.vid_canvas.unbind_all("<MouseWheel>"))
 
@@ -158,197 +223,240 @@ class SakuraDownloader:
     def _on_mousewheel_vid(self, event):
         self.vid_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
 
+    def _on_vid_scroll(self, first, last):
+        self.vid_scrollbar.set(first, last)
+        self._sync_visible_rows()
+
+    def _on_vid_configure(self, event):
+        width = max(event.width - 2 * ROW_PAD, 1)
+        for _, _, win, _ in self._rows.values():
+            self.vid_canvas.itemconfigure(win, width=width)
+        self.render_download_items()
+
     def _on_mousewheel_log(self, event):
         self.log_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
         
     def clear_all_items(self):
+        for item in self.download_items:
+            self.scheduler.cancel(item["url"])
         self.download_items.clear()
         self.render_download_items()
         self.log("Список роликов очищен.")
+
     def add_to_list(self):
-        url = self.url.get().strip()
-        if not url or url in [item["url"] for item in self.download_items]:
+        text = self.url.get().strip()
+        if not text:
+            return
+        urls = parse_bulk_text(text) or [text]
+        # Несколько ссылок, плейлист или канал — пакетный режим
+        if len(urls) > 1 or is_collection_url(urls[0]):
+            self.ingest_urls(urls)
+            return
+        url = urls[0]
+        if url in [item["url"] for item in self.download_items]:
             return
 
         def worker():
             try:
-                with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                title = info.get("title", url)
-                video_id = info.get("id")
-                thumb_base = f"https://img.youtube.com/vi/{video_id}/"
-                preview_options = [
-                    ("1920x1080", "maxresdefault.jpg"),
-                    ("1280x720", "sddefault.jpg"),
-                    ("640x480", "hqdefault.jpg"),
-                    ("320x180", "mqdefault.jpg"),
-                    ("120x90", "default.jpg"),
-                ]
-                available_previews = []
-                for res, fname in preview_options:
-                    try:
-                        resp = requests.get(thumb_base + fname, timeout=3)
-                        if resp.status_code == 200 and resp.content[:3] != b'\x00\x00\x00':
-                            available_previews.append((res, thumb_base + fname))
-                    except Exception:
-                        pass
-
-                # Форматы: показывать ВСЁ, что есть (и с аудио, и без)
-                formats = info.get("formats", [])
-                format_choices = []
-                format_map = {}
-                for f in formats:
-                    note = f.get('format_note', '')
-                    ext = f.get('ext', '')
-                    acodec = f.get('acodec')
-                    vcodec = f.get('vcodec')
-                    height = f.get('height')
-                    fps = f.get('fps')
-                    label = f"{ext}"
-                    if note:
-                        label += f" {note}"
-                    if height:
-                        label += f" {height}p"
-                    if fps:
-                        label += f" {fps}fps"
-                    if vcodec and vcodec != 'none':
-                        label += f" {vcodec}"
-                    if acodec and acodec != 'none':
-                        label += f" audio"
-                    format_choices.append(label)
-                    format_map[label] = f["format_id"]
-
-                dubbed_audio_tracks = []
-                for f in formats:
-                    note = f.get('format_note', '')
-                    ext = f.get('ext', '')
-                    acodec = f.get('acodec')
-                    vcodec = f.get('vcodec')
-                    lang = f.get("language") or ""
-                    # Оригинальные видео (не дубляж)
-                    if not ("dubbed" in note.lower() or "дубляж" in note.lower()):
-                        # Только с видео и аудио
-                        if vcodec != 'none' and acodec != 'none':
-                            label = f"{ext}"
-                            if note:
-                                label += f" {note}"
-                            if height:
-                                label += f" {height}p"
-                            if fps:
-                                label += f" {fps}fps"
-                            if vcodec and vcodec != 'none':
-                                label += f" {vcodec}"
-                            if acodec and acodec != 'none':
-                                label += f" audio"
-                            if acodec == 'none':
-                                label += " (без звука)"
-                            format_choices.append(label)
-                            format_map[label] = f["format_id"]
-                    else:
-                        # Сохраняем дубляжные аудиодорожки
-                        dubbed_audio_tracks.append({
-                            "lang": lang,
-                            "label": f"{LANG_NATIVE.get(lang, lang)} (dubbed)",
-                            "format_id": f["format_id"],
-                            "ext": ext
-                        })
-
-                subtitles = info.get("subtitles", {})
-                subtitle_choices = []
-                subtitle_map = {}
-                for lang, tracks in subtitles.items():
-                    for track in tracks:
-                        ext = track.get("ext", "vtt")
-                        name = f"{lang} ({ext})"
-                        subtitle_choices.append(name)
-                        subtitle_map[name] = {"lang": lang, "ext": ext}
-
-                item = {
-                    "url": url,
-                    "title_base": title,
-                    "title": title,
-                    "thumb_url": available_previews[0][1] if available_previews else "",
-                    "formats": formats,
-                    "format_choices": format_choices,
-                    "format_map": format_map,
-                    "format_var": StringVar(value=format_choices[0]),
-                    "preview_choices": available_previews,
-                    "preview_var": StringVar(value=available_previews[0][0] if available_previews else ""),
-                    "subtitle_choices": subtitle_choices,
-                    "subtitle_map": subtitle_map,
-                    "subtitle_var": StringVar(value=subtitle_choices[0] if subtitle_choices else ""),
-                    "dubbed_audio_tracks": dubbed_audio_tracks,
-                    "dub_choices": [track["label"] for track in dubbed_audio_tracks],
-                    "dub_var": StringVar(value=dubbed_audio_tracks[0]["label"] if dubbed_audio_tracks else ""),
-                }
-                self.download_items.insert(0, item)
-                self.history_manager.add(url, item["thumb_url"])
-                self.root.after(0, self.render_download_items)
+                data = self.engine.describe(url)
+                self.events.post(ITEM_READY, data)
             except Exception as e:
                 self.log(f"Ошибка: {e}")
 
         threading.Thread(target=worker, daemon=True).start()
 
+    def _on_items_ready(self, batch):
+        # Все ролики, разобранные за тик, — одной перерисовкой списка
+        for (data,) in batch:
+            self._insert_item(data, render=False)
+        self.render_download_items()
+
+    def _insert_item(self, data, render=True):
+        # Только из Tk-потока: здесь создаются StringVar
+        for item in self.download_items:
+            if item["url"] == data["url"]:
+                return item
+        item = dict(
+            data,
+            format_var=StringVar(value=data["formats"].choices[0] if data["formats"].choices else ""),
+            preview_var=StringVar(value=data["preview_choices"][0][0] if data["preview_choices"] else ""),
+            subtitle_var=StringVar(value=data["subtitle_choices"][0] if data["subtitle_choices"] else ""),
+            dub_var=StringVar(value=data["formats"].dub_choices[0] if data["formats"].dubs else ""),
+            status_var=StringVar(value=""),
+        )
+        self.download_items.insert(0, item)
+        self.history_manager.add(item["url"], item["thumb_url"], item["title"])
+        if render:
+            self.render_download_items()
+        return item
+
+    def _verify_previews(self, item, menu):
+        # Первое открытие меню превью: HEAD-проверка вариантов в фоне, потом меню пересобирается
+        if item.get("previews_verified"):
+            return
+        item["previews_verified"] = True
+        choices = item["preview_choices"]
+
+        def worker():
+            checked = self.engine.verify_previews(item["url"], choices)
+            self.events.call(lambda: self._set_previews(item, checked, menu))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _set_previews(self, item, choices, menu):
+        item["preview_choices"] = choices
+        labels = [res for res, url in choices]
+        if labels and item["preview_var"].get() not in labels:
+            item["preview_var"].set(labels[0])
+
+        def pick(res):
+            item["preview_var"].set(res)
+            self.save_preview_dialog(item, res)
+
+        try:
+            menu.delete(0, "end")
+            for res in labels:
+                menu.add_command(label=res, command=lambda res=res: pick(res))
+        except TclError:
+            pass  # строку уже убрали из видимой области — при следующей отрисовке меню соберётся заново
+
+    def show_bulk_dialog(self):
+        win = Toplevel(self.root)
+        win.title("Пакетное добавление")
+        win.configure(bg="#fff0f5")
+        Label(win, text="Ссылки по одной на строку (плейлисты и каналы тоже):", bg="#fff0f5").pack(anchor="w", padx=8, pady=(8, 2))
+        txt = Text(win, height=15, width=70, wrap="none")
+        txt.pack(fill="both", expand=True, padx=8)
+
+        def load_file():
+            path = filedialog.askopenfilename(
+                title="Файл со ссылками", filetypes=[("Текст", "*.txt"), ("Все файлы", "*.*")]
+            )
+            if path:
+                txt.insert("end", "\n".join(read_url_file(path)) + "\n")
+
+        def submit():
+            urls = parse_bulk_text(txt.get("1.0", "end"))
+            win.destroy()
+            self.ingest_urls(urls)
+
+        btnf = Frame(win, bg="#fff0f5")
+        btnf.pack(pady=6)
+        Button(btnf, text="Из файла…", command=load_file, bg="#ffe6f0").pack(side="left", padx=4)
+        Button(btnf, text="➕ Добавить все", command=submit, bg="#ff99cc").pack(side="left", padx=4)
+
+    def ingest_urls(self, urls):
+        if not urls:
+            return
+        known = {cache_key(item["url"]) for item in self.download_items}
+
+        def on_result(data):
+            self.events.post(ITEM_READY, data)
+
+        def on_error(url, error):
+            self.log(f"Ошибка ({url}): {error}")
+
+        def on_done(ingestor):
+            self.log(f"Пакетное добавление: обработано {ingestor.finished} из {ingestor.total}")
+
+        ingestor = BulkIngestor(self.engine.describe, on_result, on_error, on_done)
+        ingestor.start(urls, known)
+        ingestor.close()
+        self.log(f"Пакетное добавление: ссылок {len(urls)}, идёт разбор…")
+
     def extract_video_id(self, url):
-        import re
-        m = re.search(r"(?:v=|be/)([A-Za-z0-9_-]{11})", url)
-        return m.group(1) if m else "dQw4w9WgXcQ"
+        return extract_video_id(url) or "dQw4w9WgXcQ"
 
     def render_download_items(self):
-        for widget in self.items_frame.winfo_children():
-            widget.destroy()
-        for idx, item in enumerate(self.download_items):
-            frm = Frame(self.items_frame, bg="#ffe6f0", bd=2, relief="groove", padx=8, pady=8)
-            frm.pack(fill="x", pady=6, padx=6)
-            # Миниатюра слева
-            left = Frame(frm, bg="#ffe6f0")
-            left.pack(side="left", padx=4)
-            try:
-                response = requests.get(item["thumb_url"], timeout=3)
-                img = Image.open(BytesIO(response.content)).resize((120, 90))
-                thumb = ImageTk.PhotoImage(img)
-                lbl = Label(left, image=thumb, bg="#ffe6f0")
-                lbl.image = thumb
-                lbl.pack()
-            except Exception:
-                Label(left, text="нет превью", bg="#ffe6f0", fg="#888").pack()
-            # Инфо справа
-            right = Frame(frm, bg="#ffe6f0")
-            right.pack(side="left", fill="x", expand=True, padx=8)
-            Label(right, text=item.get("title", ""), bg="#ffe6f0", fg="#cc3366", font=("Helvetica", 13, "bold"), anchor="w", justify="left", wraplength=500).pack(anchor="w")
-            rowf = Frame(right, bg="#ffe6f0")
-            rowf.pack(anchor="w", pady=2)
-            Label(rowf, text="Формат:", bg="#ffe6f0").pack(side="left")
-            # Привязка StringVar и обновление названия
-            fvar = item["format_var"]
-            OptionMenu(rowf, item["format_var"], *item["format_choices"]).pack(side="left", padx=4)
-            Label(rowf, text="Качество превью:", bg="#ffe6f0").pack(side="left", padx=8)
-            OptionMenu(
-                rowf,
-                item["preview_var"],
-                *[res for res, url in item["preview_choices"]],
-                command=lambda res, i=item: self.save_preview_dialog(i, res)
-            ).pack(side="left")
-            # Субтитры
-            if item["subtitle_choices"]:
-                rowf2 = Frame(right, bg="#ffe6f0")
-                rowf2.pack(anchor="w", pady=2)
-                Label(rowf2, text="Субтитры:", bg="#ffe6f0").pack(side="left")
-                OptionMenu(rowf2, item["subtitle_var"], *item["subtitle_choices"]).pack(side="left", padx=4)
-                Button(rowf2, text="⬇️", command=lambda i=item: self.download_subs(i), bg="#fff0f5").pack(side="left", padx=2)
-            else:
-                Label(right, text="Субтитры не найдены", bg="#ffe6f0", fg="#888").pack(anchor="w", pady=2)
-            # Дубляж
-            if item["dub_choices"]:
-                Label(rowf, text="Дубляж:", bg="#ffe6f0").pack(side="left", padx=8)
-                OptionMenu(rowf, item["dub_var"], *item["dub_choices"]).pack(side="left")
-            # Кнопки
-            btnf = Frame(right, bg="#ffe6f0")
-            btnf.pack(anchor="w", pady=2)
-            Button(btnf, text="⬇️ Скачать", command=lambda i=item: self.download_video(i), bg="#fff0f5").pack(side="left", padx=2)
-            Button(btnf, text="🗑", command=lambda i=item: self.remove_item(i), bg="#ffe6f0").pack(side="left", padx=2)
+        # Высота строк фиксирована, поэтому область прокрутки считается без виджетов
+        total_height = len(self.download_items) * ROW_HEIGHT
+        self.vid_canvas.configure(scrollregion=(0, 0, self.vid_canvas.winfo_width(), total_height))
+        self._sync_visible_rows()
+
+    def _sync_visible_rows(self):
+        # Диффовый рендер: создаём строки, вошедшие в окно, двигаем сдвинувшиеся, удаляем ушедшие
+        view_top = self.vid_canvas.canvasy(0)
+        view_height = max(self.vid_canvas.winfo_height(), 220)
+        first = max(0, int(view_top // ROW_HEIGHT) - ROW_OVERSCAN)
+        last = min(len(self.download_items), int((view_top + view_height) // ROW_HEIGHT) + 1 + ROW_OVERSCAN)
+        wanted = {}
+        for idx in range(first, last):
+            item = self.download_items[idx]
+            wanted[id(item)] = (idx, item)
+
+        for key in list(self._rows):
+            if key not in wanted:
+                _, frm, win, _ = self._rows.pop(key)
+                self.vid_canvas.delete(win)
+                frm.destroy()
+
+        width = max(self.vid_canvas.winfo_width() - 2 * ROW_PAD, 1)
+        for key, (idx, item) in wanted.items():
+            y = idx * ROW_HEIGHT + ROW_PAD
+            row = self._rows.get(key)
+            if row is None:
+                frm = self._build_row(item)
+                win = self.vid_canvas.create_window(
+                    ROW_PAD, y, window=frm, anchor="nw",
+                    width=width, height=ROW_HEIGHT - 2 * ROW_PAD
+                )
+                self._rows[key] = (item, frm, win, idx)
+            elif row[3] != idx:
+                self.vid_canvas.coords(row[2], ROW_PAD, y)
+                self._rows[key] = (item, row[1], row[2], idx)
+
+    def _build_row(self, item):
+        frm = Frame(self.vid_canvas, bg="#ffe6f0", bd=2, relief="groove", padx=8, pady=8)
+        frm.pack_propagate(False)
+        # Миниатюра слева
+        left = Frame(frm, bg="#ffe6f0")
+        left.pack(side="left", padx=4)
+        self._thumb_label(left, item["thumb_url"], "#ffe6f0").pack()
+        # Инфо справа
+        right = Frame(frm, bg="#ffe6f0")
+        right.pack(side="left", fill="x", expand=True, padx=8)
+        Label(right, text=item.get("title", ""), bg="#ffe6f0", fg="#cc3366", font=("Helvetica", 13, "bold"), anchor="w", justify="left", wraplength=500).pack(anchor="w")
+        rowf = Frame(right, bg="#ffe6f0")
+        rowf.pack(anchor="w", pady=2)
+        Label(rowf, text="Формат:", bg="#ffe6f0").pack(side="left")
+        OptionMenu(rowf, item["format_var"], *item["formats"].choices).pack(side="left", padx=4)
+        Label(rowf, text="Качество превью:", bg="#ffe6f0").pack(side="left", padx=8)
+        preview_menu = OptionMenu(
+            rowf,
+            item["preview_var"],
+            *[res for res, url in item["preview_choices"]],
+            command=lambda res, i=item: self.save_preview_dialog(i, res)
+        )
+        preview_menu.pack(side="left")
+        menu = preview_menu["menu"]
+        menu.configure(postcommand=lambda i=item, m=menu: self._verify_previews(i, m))
+        # Субтитры
+        if item["subtitle_choices"]:
+            rowf2 = Frame(right, bg="#ffe6f0")
+            rowf2.pack(anchor="w", pady=2)
+            Label(rowf2, text="Субтитры:", bg="#ffe6f0").pack(side="left")
+            OptionMenu(rowf2, item["subtitle_var"], *item["subtitle_choices"]).pack(side="left", padx=4)
+            Button(rowf2, text="⬇️", command=lambda i=item: self.download_subs(i), bg="#fff0f5").pack(side="left", padx=2)
+        else:
+            Label(right, text="Субтитры не найдены", bg="#ffe6f0", fg="#888").pack(anchor="w", pady=2)
+        # Дубляж
+        if item["formats"].dubs:
+            Label(rowf, text="Дубляж:", bg="#ffe6f0").pack(side="left", padx=8)
+            OptionMenu(rowf, item["dub_var"], *item["formats"].dub_choices, DUB_ALL_LABEL).pack(side="left")
+        # Кнопки
+        btnf = Frame(right, bg="#ffe6f0")
+        btnf.pack(anchor="w", pady=2)
+        Button(btnf, text="⬇️ Скачать", command=lambda i=item: self.download_video(i), bg="#fff0f5").pack(side="left", padx=2)
+        Button(btnf, text="🎵", command=lambda i=item: self.download_audio(i), bg="#fff0f5").pack(side="left", padx=2)
+        Button(btnf, text="🗑", command=lambda i=item: self.remove_item(i), bg="#ffe6f0").pack(side="left", padx=2)
+        # Управление задачей в очереди загрузок
+        Button(btnf, text="⏯", command=lambda i=item: self.toggle_pause(i), bg="#ffe6f0").pack(side="left", padx=2)
+        Button(btnf, text="✖", command=lambda i=item: self.scheduler.cancel(i["url"]), bg="#ffe6f0").pack(side="left", padx=2)
+        Label(btnf, textvariable=item["status_var"], bg="#ffe6f0", fg="#800040").pack(side="left", padx=6)
+        return frm
 
     def remove_item(self, item):
+        self.scheduler.cancel(item["url"])
         self.download_items.remove(item)
         self.selected_item = None
         self.render_download_items()
@@ -358,20 +466,39 @@ class SakuraDownloader:
         self.preview_frame.grid()
         self.build_preview_block(item)
 
+    def _thumb_label(self, parent, url, bg):
+        # Заглушка сразу, миниатюра — когда догрузится и уменьшится в фоне
+        photo = self.thumb_cache.peek_photo(url, LIST_THUMB_SIZE) if url else None
+        if photo is not None:
+            lbl = Label(parent, image=photo, bg=bg)
+            lbl.image = photo
+            return lbl
+        lbl = Label(parent, text="…" if url else "нет превью", bg=bg, fg="#888", width=15, height=5)
+        if url:
+            self.thumb_cache.get_photo_async(
+                url, LIST_THUMB_SIZE,
+                lambda photo, l=lbl: self._set_thumb(l, photo),
+                self.events.call,
+            )
+        return lbl
+
+    def _set_thumb(self, lbl, photo):
+        # Строку могли убрать из видимой области, пока миниатюра грузилась
+        if not lbl.winfo_exists():
+            return
+        if photo is None:
+            lbl.config(text="нет превью")
+            return
+        lbl.config(image=photo, text="", width=LIST_THUMB_SIZE[0], height=LIST_THUMB_SIZE[1])
+        lbl.image = photo
+
     def build_preview_block(self, item):
         for w in self.preview_frame.winfo_children():
             w.destroy()
         # Ссылка
         Entry(self.preview_frame, width=50, state="readonly", readonlybackground="#fff0f5", fg="#333", borderwidth=0, relief="flat", font=("Arial", 10), justify="left").grid(row=0, column=0, columnspan=3, sticky="w")
         # Миниатюра и название
-        try:
-            response = requests.get(item["thumb_url"])
-            img = Image.open(BytesIO(response.content)).resize((120, 90))
-            self.preview_thumb = ImageTk.PhotoImage(img)
-            preview_thumb_label = Label(self.preview_frame, image=self.preview_thumb, bg="#fff0f5")
-            preview_thumb_label.grid(row=1, column=0, rowspan=3)
-        except Exception:
-            Label(self.preview_frame, text="(нет превью)", bg="#fff0f5").grid(row=1, column=0, rowspan=3)
+        self._thumb_label(self.preview_frame, item["thumb_url"], "#fff0f5").grid(row=1, column=0, rowspan=3)
         Label(self.preview_frame, text=item.get("title", ""), bg="#fff0f5", fg="#cc3366", font=("Helvetica", 12, "bold")).grid(row=1, column=1, sticky="w")
         # Формат
         Label(self.preview_frame, text="Формат:", bg="#fff0f5").grid(row=2, column=1, sticky="w")
@@ -401,49 +528,135 @@ class SakuraDownloader:
         folder = filedialog.askdirectory(title="Выберите папку для всех превью")
         if not folder:
             return
+        # Выбор читаем в Tk-потоке, скачивание — в фоне
+        tasks = []
         for item in self.download_items:
-            res = item["preview_var"].get()
-            url = ""
-            for r, u in item["preview_choices"]:
-                if r == res:
-                    url = u
-                    break
-            if url:
-                try:
-                    response = requests.get(url)
-                    if response.status_code == 200:
-                        filename = f"{item['title']}_{res}.jpg"
-                        filename = sanitize_filename(filename)  # <--- добавлено
-                        path = os.path.join(folder, filename)
-                        with open(path, "wb") as f:
-                            f.write(response.content)
-                        self.log(f"Сохранено превью для '{item['title']}' в разрешении {res} в папку {folder}")
-                    else:
-                        self.log(f"Ошибка загрузки превью для {item['title']}")
-                except Exception as e:
-                    self.log(f"Ошибка: {e}")
+            task = self._preview_task(item, item["preview_var"].get(), folder)
+            if task:
+                tasks.append(task)
+        if not tasks:
+            self.log("Нет превью для сохранения.")
+            return
+        self.log(f"Сохранение превью: {len(tasks)} шт. в папку {folder}")
+        self._export_previews(tasks)
+
+    def _preview_task(self, item, resolution, folder):
+        for res, url in item["preview_choices"]:
+            if res == resolution:
+                filename = sanitize_filename(f"{item['title']}_{res}.{preview_ext(url)}")
+                return url, os.path.join(folder, filename)
+        return None
 
+    def _export_previews(self, tasks):
+        def on_result(url, path, status, error):
+            if status == FAILED_PREVIEW:
+                self.log(f"Ошибка загрузки превью {os.path.basename(path)}: {error}")
+            elif len(tasks) == 1:
+                self.log(f"Сохранено превью: {path}")
+
+        def on_done(counts):
+            if len(tasks) > 1:
+                self.log(f"Превью: сохранено {counts[SAVED]}, без изменений {counts[UNCHANGED]}, ошибок {counts[FAILED_PREVIEW]}")
+
+        PreviewExporter(on_result=on_result, on_done=on_done).start(tasks)
 
     def download_all_videos(self):
         out_dir = filedialog.askdirectory(title="Выберите папку для всех видео")
         if not out_dir:
             return
-        for item in self.download_items:
-            fmt = item["format_var"].get()
-            # Очистка имени файла
-            safe_title = sanitize_filename(item["title"])
-            ydl_opts = {
-                'outtmpl': os.path.join(out_dir, f'{safe_title}.%(ext)s'),
-                'format': item["format_map"][fmt],
-                'quiet': False,
-                'noplaylist': True,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Верхние элементы списка получают больший приоритет
+        total = len(self.download_items)
+        for idx, item in enumerate(self.download_items):
+            self._queue_job(item, "format", out_dir, priority=total - idx)
+        self.log(f"В очередь поставлено роликов: {total}")
+
+    def download_all_audio(self):
+        out_dir = filedialog.askdirectory(title="Выберите папку для звука")
+        if not out_dir:
+            return
+        total = len(self.download_items)
+        for idx, item in enumerate(self.download_items):
+            self._queue_job(item, "audio", out_dir, priority=total - idx)
+        self.log(f"В очередь на извлечение звука ({self.audio_format.get()}): {total}")
+
+    def _queue_job(self, item, kind, out_dir, priority=0, format_label=None):
+        # Значения StringVar читаем здесь, в Tk-потоке; движку уходят готовые строки.
+        # Для звука вместо формата ролика — целевой формат (mp3/opus)
+        if format_label is None:
+            format_label = self.audio_format.get() if kind == "audio" else item["format_var"].get()
+        self.library  # без индекса движок не проверит, скачано ли это уже
+        self.journal  # а без журнала задача не переживёт перезапуск
+        self.engine.queue(
+            item, kind, out_dir,
+            format_label=format_label,
+            dub=item["dub_var"].get(),
+            subtitle=item["subtitle_var"].get(),
+            priority=priority,
+        )
+
+    def resume_unfinished_jobs(self):
+        for row in self.journal.given_up():
+            self.log(f"Не возобновляется после {row['attempts']} неудач: {row['title'] or row['url']} ({row['error']})")
+        rows = self.journal.unfinished()
+        if not rows:
+            return
+        self.log(f"Возобновление незавершённых загрузок: {len(rows)}")
+
+        def worker():
+            # Метаданные почти всегда в кэше, так что это быстро
+            for row in rows:
                 try:
-                    ydl.download([item["url"]])
-                    self.log(f"Скачано видео: {item['title']}")
+                    data = self.engine.describe(row["url"])
                 except Exception as e:
-                    self.log(f"Ошибка скачивания: {e}")
+                    self.log(f"Не удалось возобновить {row['url']}: {e}")
+                    continue
+                self.events.post(JOB_RESUME, data, row)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_jobs_resume(self, batch):
+        for data, row in batch:
+            self._resume_job(data, row)
+        self.render_download_items()
+
+    def _resume_job(self, data, row):
+        item = self._insert_item(data, render=False)
+        # Восстанавливаем выбор пользователя, если такие варианты ещё есть
+        for var, value, choices in (
+            (item["format_var"], row["format_label"], item["formats"].by_label),
+            (item["dub_var"], row["dub"], item["formats"].dub_choices + [DUB_ALL_LABEL]),
+            (item["subtitle_var"], row["subtitle"], item["subtitle_choices"]),
+        ):
+            if value in choices:
+                var.set(value)
+        self._queue_job(item, row["kind"], row["out_dir"],
+                        format_label=row["format_label"] if row["kind"] == "audio" else None)
+
+    def toggle_pause(self, item):
+        job = self.scheduler.jobs.get(item["url"])
+        if not job:
+            return
+        if job.state == PAUSED:
+            self.scheduler.resume(item["url"])
+        else:
+            self.scheduler.pause(item["url"])
+
+    def _on_job_update(self, job):
+        # Вызывается из воркеров: только запоминаем состояние, в окно его перенесёт _flush_log
+        if job.state == RUNNING:
+            text = f"⬇ {job.progress.get('percent', '')} {job.progress.get('speed', '')}".strip()
+        else:
+            text = {
+                QUEUED: "в очереди",
+                PAUSED: "пауза",
+                MERGING: "сведение…",
+                CANCELLED: "отменено",
+                DONE: "готово ✔",
+                FAILED: f"ошибка: {job.error}",
+            }.get(job.state, "")
+        if job.state == FAILED:
+            self.log_sink.write(f"Ошибка скачивания: {job.error}")
+        self.log_sink.progress(job.key, text)
 
     def download_everything(self):
         self.download_all_subs()
@@ -451,235 +664,75 @@ class SakuraDownloader:
         self.download_all_videos()
 
     def show_history(self):
-        win = Toplevel(self.root)
-        win.title("История загрузок")
-        win.configure(bg="#fff0f5")
-        for idx, item in enumerate(self.history_manager.history):
-            frm = Frame(win, bg="#fff0f5", bd=1, relief="solid", padx=2, pady=2)
-            frm.grid(row=idx, column=0, sticky="ew", pady=2)
-            # Миниатюра
-            try:
-                response = requests.get(item["thumb_url"])
-                img = Image.open(BytesIO(response.content)).resize((60, 45))
-                thumb = ImageTk.PhotoImage(img)
-                lbl = Label(frm, image=thumb, bg="#fff0f5")
-                lbl.image = thumb
-                lbl.pack(side="left")
-            except Exception:
-                Label(frm, text="(нет превью)", bg="#fff0f5").pack(side="left")
-            # Ссылка
-            url_entry = Entry(frm, width=40)
-            url_entry.insert(0, item["url"])
-            url_entry.pack(side="left", padx=5)
-            # Кнопка вставить
-            Button(frm, text="⏎", command=lambda u=item["url"]: self.url.set(u), bg="#e0e0e0").pack(side="left", padx=2)
-            # Кнопка удалить
-            Button(frm, text="🗑", command=lambda i=idx: self.remove_history_item(i, win), bg="#ffe6f0").pack(side="left", padx=2)
-        Button(win, text="Очистить историю", command=lambda: self.clear_history(win), bg="#ffb3d9").grid(row=999, column=0, pady=5)
-
-    def remove_history_item(self, idx, win):
-        del self.history_manager.history[idx]
-        self.history_manager.save_history()
-        win.destroy()
-        self.show_history()
-
-    def clear_history(self, win):
-        self.history_manager.history.clear()
-        self.history_manager.save_history()
-        win.destroy()
-        self.show_history()
+        # Одно окно истории: повторное нажатие просто поднимает его
+        if self.history_window and self.history_window.exists():
+            self.history_window.lift()
+            return
+        self.history_window = HistoryWindow(self.root, self.history_manager, self.thumb_cache, self.url.set,
+                                            schedule=self.events.call)
+
+    def rescan_library(self):
+        # Папка с уже скачанными роликами: индекс пересобирается по её манифестам в фоне
+        folder = filedialog.askdirectory(title="Папка для пересканирования библиотеки")
+        if not folder:
+            return
+        self.log(f"Библиотека: сканирование {folder}…")
+        threading.Thread(target=lambda: self.library.rescan([folder], self.log), daemon=True).start()
+
+    def show_stats(self):
+        if self.stats_window and self.stats_window.exists():
+            self.stats_window.lift()
+            return
+        self.stats_window = StatsWindow(self.root, self.engine.metrics, self.log)
 
     def log(self, msg):
-        if self.log_output:
+        # Из любого потока: строка попадёт в окно при ближайшем _flush_log
+        self.log_sink.write(msg)
+
+    def _flush_log(self):
+        # На каждом тике диспетчера: все накопившиеся строки одной вставкой и последний прогресс по роликам
+        lines, dropped, progress = self.log_sink.drain()
+        if lines:
+            if dropped:
+                lines.insert(0, f"... пропущено строк: {dropped}")
             self.log_output.config(state="normal")
-            self.log_output.insert("end", msg + "\n")
+            self.log_output.insert("end", "\n".join(lines) + "\n")
+            # Окно хранит не больше MAX_LOG_LINES строк
+            excess = int(self.log_output.index("end-1c").split(".")[0]) - MAX_LOG_LINES
+            if excess > 0:
+                self.log_output.delete("1.0", f"{excess + 1}.0")
             self.log_output.see("end")
             self.log_output.config(state="disabled")
-        else:
-            print(msg)
+        if progress:
+            for item in self.download_items:
+                text = progress.get(item["url"])
+                if text is not None and item["status_var"].get() != text:
+                    item["status_var"].set(text)
+
+    def _toggle_log_file(self):
+        self.log_sink.set_file(LOG_FILE_PATH if self.log_to_file.get() else None)
 
     def save_preview_dialog(self, item, resolution):
-        # Найти ссылку по resolution
-        url = ""
-        for res, u in item["preview_choices"]:
-            if res == resolution:
-                url = u
-                break
-        if not url:
-            self.log("Не удалось найти превью для выбранного разрешения.")
-            return
-        folder = filedialog.askdirectory(title="Выберите папку для сохранения превью")
-        if not folder:
-            return
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                filename = sanitize_filename(f"{item['title']}_{resolution}.jpg")
-                path = os.path.join(folder, filename)
-                with open(path, "wb") as f:
-                    f.write(response.content)
-                self.log(f"Сохранено превью для '{item['title']}' в разрешении {resolution} в папку {folder}")
-            else:
-                self.log("Ошибка загрузки превью.")
-        except Exception as e:
-            self.log(f"Ошибка: {e}")
-
-    def merge_video_with_dub(self, orig_path, dub_path, out_path):
-        # Проверяем, есть ли видео-дорожка в оригинале
-        import subprocess
-        import json
-
-        # Получаем информацию о дорожках
-        def has_video(path):
-            cmd = [
-                "ffprobe", "-v", "error", "-select_streams", "v",
-                "-show_entries", "stream=codec_type", "-of", "json", path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            info = json.loads(result.stdout)
-            return bool(info.get("streams"))
-
-        if has_video(orig_path):
-            # Оригинал содержит видео — объединяем видео + дубляж
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", orig_path,
-                "-i", dub_path,
-                "-c:v", "copy",
-                "-c:a", "aac",
-                "-map", "0:v:0",
-                "-map", "1:a:0",
-                "-shortest",
-                out_path  
-            ]
+        folder = ""
+        if any(res == resolution for res, _ in item["preview_choices"]):
+            folder = filedialog.askdirectory(title="Выберите папку для сохранения превью")
         else:
-            # Оригинал — только аудио, просто копируем дубляж
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", dub_path,
-                "-c:a", "aac",
-                out_path
-            ]
-        subprocess.run(cmd, check=True)
+            self.log("Не удалось найти превью для выбранного разрешения.")
+        if folder:
+            self._export_previews([self._preview_task(item, resolution, folder)])
 
     def download_video(self, item):
-        def worker():
-            out_dir = filedialog.askdirectory(title="Выберите папку для видео")
-            if not out_dir:
-                return
-
-            safe_title = sanitize_filename(item['title_base'])
-
-            # Ищем лучший видеопоток
-            best_video = None
-            best_height = -1
-            for f in item["formats"]:
-                if f.get("vcodec") != "none" and f.get("acodec") == "none":
-                    h = f.get("height") or 0
-                    if h > best_height:
-                        best_height = h
-                        best_video = f
-
-            # Ищем лучший аудиопоток
-            best_audio = None
-            best_abr = -1
-            for f in item["formats"]:
-                if f.get("acodec") != "none" and f.get("vcodec") == "none":
-                    abr = f.get("abr") or 0
-                    if abr > best_abr:
-                        best_abr = abr
-                        best_audio = f
-
-            video_path = os.path.join(out_dir, f"{safe_title}_video.mp4")
-            audio_path = os.path.join(out_dir, f"{safe_title}_audio.m4a")
-            orig_path = os.path.join(out_dir, f"{safe_title}_orig.mp4")
-            out_path = os.path.join(out_dir, f"{safe_title}.mp4")
-
-            def log_safe(msg):
-                self.root.after(0, lambda: self.log(msg))
-
-            if best_video and best_audio:
-                # Скачиваем видео
-                ydl_opts_video = {
-                    'outtmpl': video_path,
-                    'format': best_video["format_id"],
-                    'quiet': True,
-                    'noplaylist': True,
-                    'no_warnings': True,
-                    'logger': YTDLLogger(log_safe),
-                    'progress_hooks': [lambda d: ytdl_hook(d, log_safe)],
-                }
-                with yt_dlp.YoutubeDL(ydl_opts_video) as ydl:
-                    ydl.download([item["url"]])
-
-                # Скачиваем аудио
-                ydl_opts_audio = {
-                    'outtmpl': audio_path,
-                    'format': best_audio["format_id"],
-                    'quiet': True,
-                    'noplaylist': True,
-                    'no_warnings': True,
-                    'logger': YTDLLogger(log_safe),
-                    'progress_hooks': [lambda d: ytdl_hook(d, log_safe)],
-                }
-                with yt_dlp.YoutubeDL(ydl_opts_audio) as ydl:
-                    ydl.download([item["url"]])
-
-                # Объединяем
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-i", video_path,
-                    "-i", audio_path,
-                    "-c:v", "copy",
-                    "-c:a", "aac",
-                    orig_path
-                ]
-                subprocess.run(cmd, check=True)
-            else:
-                log_safe("Не удалось найти подходящие видео и аудио потоки.")
-                return
-
-            # Дальше — объединение с дубляжом
-            if item.get("dubbed_audio_tracks"):
-                selected_dub = item["dub_var"].get()
-                dub = None
-                for track in item["dubbed_audio_tracks"]:
-                    if track["label"] == selected_dub:
-                        dub = track
-                        break
-                if not dub:
-                    dub = item["dubbed_audio_tracks"][0]  # fallback
-
-                dub_path = os.path.join(out_dir, f"{safe_title}_dub.{dub['ext']}")
-                ydl_opts_dub = {
-                    'outtmpl': dub_path,
-                    'format': dub["format_id"],
-                    'quiet': True,
-                    'noplaylist': True,
-                    'no_warnings': True,
-                    'logger': YTDLLogger(log_safe),
-                    'progress_hooks': [lambda d: ytdl_hook(d, log_safe)],
-                }
-                with yt_dlp.YoutubeDL(ydl_opts_dub) as ydl:
-                    ydl.download([item["url"]])
-                self.merge_video_with_dub(orig_path, dub_path, out_path)
-                # Удаляем временные файлы
-                for f in [video_path, audio_path, orig_path, dub_path]:
-                    try:
-                        if os.path.exists(f):
-                            os.remove(f)
-                    except Exception:
-                        pass
-            else:
-                os.rename(orig_path, out_path)
-                for f in [video_path, audio_path, orig_path]:
-                    try:
-                        if os.path.exists(f):
-                            os.remove(f)
-                    except Exception:
-                        pass
+        # Папку спрашиваем в Tk-потоке, сама загрузка — в очереди планировщика
+        out_dir = filedialog.askdirectory(title="Выберите папку для видео")
+        if not out_dir:
+            return
+        self._queue_job(item, "best", out_dir, priority=len(self.download_items) + 1)
 
-        threading.Thread(target=worker, daemon=True).start()
+    def download_audio(self, item):
+        out_dir = filedialog.askdirectory(title="Выберите папку для звука")
+        if not out_dir:
+            return
+        self._queue_job(item, "audio", out_dir, priority=len(self.download_items) + 1)
 
     def download_subs(self, item):
         if not item["subtitle_choices"]:
@@ -693,46 +746,13 @@ class SakuraDownloader:
         out_dir = filedialog.askdirectory(title="Выберите папку для субтитров")
         if not out_dir:
             return
-        safe_title = sanitize_filename(item["title"])
-        ydl_opts = {
-            'skip_download': True,
-            'writesubtitles': True,
-            'subtitleslangs': [sub_info["lang"]],
-            'subtitlesformat': sub_info["ext"],
-            'outtmpl': os.path.join(out_dir, f'{safe_title}.%(ext)s'),
-            'quiet': False,
-            'no_warnings': True,
-        }
         def worker():
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                try:
-                    ydl.download([item["url"]])
-                    self.log(f"Скачаны субтитры ({lang_ext}) для: {item['title']}")
-                except Exception as e:
-                    self.log(f"Ошибка скачивания субтитров: {e}")
+            try:
+                download_subtitles(item, lang_ext, out_dir, self.log)
+                self.log(f"Скачаны субтитры ({lang_ext}) для: {item['title']}")
+            except Exception as e:
+                self.log(f"Ошибка скачивания субтитров: {e}")
         threading.Thread(target=worker, daemon=True).start()
 
-LANG_NATIVE = {
-    "ru": "Русский",
-    "en": "English",
-    "es": "Español",
-    "fr": "Français",
-    "de": "Deutsch",
-    "ja": "日本語",
-    "ko": "한국어",
-    "hi": "हिन्दी",
-    "pt": "Português",
-    "it": "Italiano",
-    "tr": "Türkçe",
-    "vi": "Tiếng Việt",
-    "zh": "中文",
-    "ar": "العربية",
-    #остальные языки по необходимости...
-}
-
 def build_ui(root):
-    SakuraDownloader(root)
-
-def sanitize_filename(filename):
-    import re
-    return re.sub(r'[<>:"/\\|?*]', '_', filename)
\ No newline at end of file
+    SakuraDownloader(root)
\ No newline at end of file